@@ -0,0 +1,156 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""ANN evaluation: recall-vs-latency report for the vector index backends.
+Each backend/parameter setting is compared with exact cosine search on the same
+embeddings (recall@k) and timed one query at a time (p50/p95 latency, QPS).
+Compact storage (fp16 / sq8) is reported with and without exact rescoring,
+together with the resident bytes per vector.
+Runs on the persisted corpus index (--index) or on synthetic clustered vectors.
+
+--workers 1 2 4 8 adds a core-scaling report for the sharded backend: single
+query throughput per thread count, relative to one thread and to the unsharded
+NumPy scan. Set OPENBLAS_NUM_THREADS=1 (or the MKL equivalent) so the BLAS
+library does not add its own threads to the measurement.
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+from retrieval.ann_index import make_index, resolve_kind
+
+# (kind, build params, list of search-time params to sweep)
+DEFAULT_CONFIGS = [
+    ("numpy", {}, [{}]),
+    ("flat", {}, [{}]),
+    ("sharded", {}, [{}]),
+    ("ivf", {}, [{"nprobe": 1}, {"nprobe": 4}, {"nprobe": 16}, {"nprobe": 64}]),
+    ("hnsw", {"m": 32}, [{"ef_search": 16}, {"ef_search": 64}, {"ef_search": 256}]),
+    ("fp16", {}, [{"rescore": 1}, {"rescore": 4}]),
+    ("sq8", {}, [{"rescore": 1}, {"rescore": 4}, {"rescore": 16}]),
+]
+
+def synthetic_embeddings(n, dim=384, n_clusters=64, seed=0):
+    """Gaussian blobs around random centroids: closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(n_clusters, dim)).astype('float32')
+    labels = rng.integers(0, n_clusters, size=n)
+    return centroids[labels] + 0.5 * rng.normal(size=(n, dim)).astype('float32')
+
+def exact_top_k(embeddings, queries, top_k):
+    e = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-8)
+    q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-8)
+    sims = q @ e.T
+    return np.argsort(-sims, axis=1)[:, :top_k]
+
+def recall_at_k(found_ids, true_ids):
+    k = true_ids.shape[1]
+    hits = sum(len(set(f[f >= 0].tolist()) & set(t.tolist())) for f, t in zip(found_ids, true_ids))
+    return hits / (k * len(true_ids))
+
+def recall_latency_report(embeddings, queries, top_k=10, configs=DEFAULT_CONFIGS):
+    """Return one row per (kind, params) with build time, recall@k and latency stats."""
+    truth = exact_top_k(embeddings, queries, top_k)
+    rows = []
+    for kind, build_params, sweep in configs:
+        actual = resolve_kind(kind)
+        if actual != kind:
+            continue  # backend unavailable (no faiss); NumPy is already reported
+        t0 = time.perf_counter()
+        index = make_index(kind, embeddings, **build_params)
+        build_s = time.perf_counter() - t0
+        for params in sweep:
+            index.set_params(**params)
+            latencies = []
+            found = []
+            for q in queries:
+                t0 = time.perf_counter()
+                _, ids = index.search(q[None, :], top_k)
+                latencies.append(time.perf_counter() - t0)
+                found.append(ids[0])
+            lat_ms = np.array(latencies) * 1000.0
+            rows.append({
+                "kind": kind,
+                "params": {**build_params, **params},
+                "build_s": round(build_s, 4),
+                "bytes_per_vector": getattr(index, "bytes_per_dim", 4) * embeddings.shape[1],
+                f"recall@{top_k}": round(recall_at_k(np.array(found), truth), 4),
+                "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+                "p95_ms": round(float(np.percentile(lat_ms, 95)), 4),
+                "qps": round(len(queries) / max(sum(latencies), 1e-9), 1),
+            })
+    return rows
+
+def _qps(index, queries, top_k):
+    t0 = time.perf_counter()
+    for q in queries:
+        index.search(q[None, :], top_k)
+    return len(queries) / max(time.perf_counter() - t0, 1e-9)
+
+def shard_scaling_report(embeddings, queries, top_k=10, workers=(1, 2, 4, 8), shards=None):
+    """Single-query QPS of the sharded index for each thread count (one shard per
+    thread unless `shards` is given), with speedups over one thread and over NumPy."""
+    embeddings = np.asarray(embeddings, dtype='float32')
+    base = make_index("numpy", embeddings)
+    base_qps = _qps(base, queries, top_k)
+    index = make_index("sharded", base.embeddings, normalized=True, workers=1, shards=shards or max(workers))
+    rows = []
+    for w in workers:
+        index.set_params(workers=w, shards=shards or w)
+        qps = _qps(index, queries, top_k)
+        rows.append({"workers": w, "shards": len(index.shards), "qps": round(qps, 1),
+                     "speedup": round(qps / rows[0]["qps"], 2) if rows else 1.0,
+                     "vs_numpy": round(qps / base_qps, 2)})
+    return {"rows": len(embeddings), "numpy_qps": round(base_qps, 1), "cpus": os.cpu_count(), "scaling": rows}
+
+def print_scaling(report):
+    print(f"sharded scaling over {report['rows']} rows ({report['cpus']} CPUs, numpy qps={report['numpy_qps']:.0f})")
+    for r in report["scaling"]:
+        print(f"  workers={r['workers']:<3} shards={r['shards']:<3} qps={r['qps']:<8.0f} "
+              f"speedup={r['speedup']:.2f}x vs_numpy={r['vs_numpy']:.2f}x")
+
+def print_report(rows):
+    for row in rows:
+        recall_key = next(k for k in row if k.startswith("recall@"))
+        print(f"{row['kind']:<6} {json.dumps(row['params']):<28} build={row['build_s']:.3f}s "
+              f"bytes/vec={row['bytes_per_vector']:<5} "
+              f"{recall_key}={row[recall_key]:.3f} p50={row['p50_ms']:.3f}ms "
+              f"p95={row['p95_ms']:.3f}ms qps={row['qps']:.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", help="Folder with a persisted vector index (e.g. data/processed)")
+    parser.add_argument("--n", type=int, default=20000, help="Synthetic corpus size when --index is not given")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", help="Also report sharded-search scaling for these thread counts")
+    parser.add_argument("--json", help="Write the report rows to this JSON file")
+    args = parser.parse_args()
+
+    if args.index:
+        from retrieval.vector_store import InMemoryVectorStore
+        embeddings = np.asarray(InMemoryVectorStore.load(args.index, mmap=False).embeddings, dtype='float32')
+    else:
+        embeddings = synthetic_embeddings(args.n)
+    # Queries are perturbed corpus vectors so they land in populated regions
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(embeddings), size=args.queries)
+    queries = embeddings[picks] + 0.1 * rng.normal(size=(args.queries, embeddings.shape[1])).astype('float32')
+
+    rows = recall_latency_report(embeddings, queries.astype('float32'), top_k=args.top_k)
+    print_report(rows)
+    report = rows
+    if args.workers:
+        scaling = shard_scaling_report(embeddings, queries.astype('float32'), top_k=args.top_k, workers=args.workers)
+        print_scaling(scaling)
+        report = {"backends": rows, "sharded_scaling": scaling}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""Retrieval and end-to-end benchmark.
+
+Generates a reproducible synthetic corpus of any size from the words in
+data/raw, writes it with the normal chunk store, and measures for the simple,
+vector and hybrid methods:
+- index build time and resident-memory growth
+- query latency percentiles (p50/p95/p99) and single-thread throughput
+- end-to-end latency (retrieve -> rerank -> compose_prompt -> mock LLM)
+
+Results are written as JSON; pass --baseline to flag metrics that regressed
+against a previous run (e.g. from the parent commit).
+
+    python -m evaluation.benchmark --sizes 10000 100000 --json bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from retrieval.bm25 import BM25Index
+from retrieval.cache import clear_caches
+from retrieval.chunk_store import ChunkWriter, open_chunks
+from retrieval.embeddings import embedder_name
+from retrieval.rerank import get_reranker
+from retrieval.retriever import HybridRetriever, SimpleRetriever
+from retrieval.vector_store import InMemoryVectorStore
+from llm.prompt_templates import compose_prompt
+from llm import query_llm
+
+METHODS = ("simple", "vector", "hybrid")
+# Lower is better for these; qps is the only higher-is-better metric compared
+COMPARED = ("build_s", "p50_ms", "p95_ms", "p99_ms", "qps")
+
+def source_words(source: str = "data/raw"):
+    words = []
+    for f in sorted(Path(source).glob("*.txt")):
+        words += re.findall(r"[a-z']+", f.read_text(encoding="utf-8").lower())
+    if not words:
+        raise FileNotFoundError(f"No words found in {source}/*.txt")
+    return words
+
+def write_synthetic_corpus(folder: str, n_chunks: int, source: str = "data/raw", chunk_words: int = 60,
+                           vocab_size: int = 50_000, seed: int = 0, batch: int = 10_000) -> dict:
+    """Write `n_chunks` chunks to `folder` as chunks.jsonl. Half of each chunk is a
+    window of the real text (so natural phrases match); the rest is drawn from a
+    Zipf-distributed vocabulary of the source words and numbered variants of them,
+    which gives realistic posting-list lengths at every corpus size."""
+    rng = np.random.default_rng(seed)
+    text = source_words(source)
+    counts = {}
+    for w in text:
+        counts[w] = counts.get(w, 0) + 1
+    base = sorted(counts, key=lambda w: -counts[w])
+    vocab = np.array(base + [f"{base[i % len(base)]}{i // len(base)}" for i in range(len(base), vocab_size)])
+    text_arr = np.array(text * (chunk_words // len(text) + 2))
+    real = chunk_words // 2
+    start = time.perf_counter()
+    with ChunkWriter(folder) as writer:
+        for b0 in range(0, n_chunks, batch):
+            b = min(batch, n_chunks - b0)
+            offsets = rng.integers(0, len(text), size=b)
+            windows = text_arr[offsets[:, None] + np.arange(real)]
+            ranks = np.minimum(rng.zipf(1.2, size=(b, chunk_words - real)) - 1, vocab_size - 1)
+            words = np.concatenate([windows, vocab[ranks]], axis=1)
+            for j in range(b):
+                i = b0 + j
+                writer.write({"source": f"synthetic_{i // 1000:05d}.txt", "chunk_id": i % 1000,
+                              "text": " ".join(words[j])})
+    return {"n_chunks": n_chunks, "generate_s": round(time.perf_counter() - start, 3),
+            "bytes": (Path(folder) / "chunks.jsonl").stat().st_size}
+
+def sample_queries(n: int, source: str = "data/raw", seed: int = 1):
+    """Unique 2-5 word phrases from the source text."""
+    rng = np.random.default_rng(seed)
+    text = source_words(source)
+    queries = []
+    for _ in range(n * 20):
+        length = int(rng.integers(2, 6))
+        i = int(rng.integers(0, max(1, len(text) - length)))
+        q = " ".join(text[i:i + length])
+        if q not in queries:
+            queries.append(q)
+        if len(queries) == n:
+            break
+    return queries
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), else the peak reported by getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed_build(fn):
+    before = rss_mb()
+    t0 = time.perf_counter()
+    result = fn()
+    return result, {"build_s": round(time.perf_counter() - t0, 3), "rss_delta_mb": round(rss_mb() - before, 1)}
+
+def latency_stats(fn, queries) -> dict:
+    clear_caches()  # measure cold queries, not result-cache hits
+    latencies = []
+    t_start = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    wall = time.perf_counter() - t_start
+    lat = np.array(latencies)
+    return {"queries": len(queries), "mean_ms": round(float(lat.mean()), 3),
+            **{f"p{p}_ms": round(float(np.percentile(lat, p)), 3) for p in (50, 95, 99)},
+            "qps": round(len(queries) / max(wall, 1e-9), 1)}
+
+def run_benchmark(n_chunks: int, n_queries: int = 200, methods=METHODS, source: str = "data/raw",
+                  workdir: str = None, index_type: str = None, top_k: int = 5, seed: int = 0) -> dict:
+    """Benchmark one corpus size; the LLM is always the mock (no API calls)."""
+    workdir = workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    corpus = write_synthetic_corpus(workdir, n_chunks, source=source, seed=seed)
+    chunks = open_chunks(workdir)
+    queries = sample_queries(n_queries, source=source, seed=seed + 1)
+
+    build, retrievers = {}, {}
+    if "simple" in methods:
+        retrievers["simple"], build["simple"] = timed_build(lambda: SimpleRetriever(chunks))
+    if "vector" in methods or "hybrid" in methods:
+        store, build["vector"] = timed_build(lambda: _build_store(chunks, index_type))
+        retrievers["vector"] = store
+    if "hybrid" in methods:
+        bm25, build["bm25"] = timed_build(lambda: BM25Index.build(chunks))
+        retrievers["hybrid"] = HybridRetriever(chunks, bm25=bm25, store=store)
+
+    search = {
+        "simple": lambda q: retrievers["simple"].search(q, k=top_k),
+        "vector": lambda q: retrievers["vector"].search(q, top_k=top_k),
+        "hybrid": lambda q: retrievers["hybrid"].search(q, k=top_k),
+    }
+    reranker = get_reranker()
+
+    def answer(method):
+        def run(q):
+            context = reranker.rerank(q, search[method](q))[:3]
+            return query_llm.query_openai(compose_prompt(q, context), use_cache=False)
+        return run
+
+    api_key = os.environ.pop("OPENAI_API_KEY", None)  # force the mock LLM
+    try:
+        query = {m: latency_stats(search[m], queries) for m in methods}
+        end_to_end = {m: latency_stats(answer(m), queries) for m in methods}
+    finally:
+        if api_key is not None:
+            os.environ["OPENAI_API_KEY"] = api_key
+    return {"corpus": corpus, "build": build, "query": query, "end_to_end": end_to_end,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+def _build_store(chunks, index_type):
+    store = InMemoryVectorStore(index_type)
+    store.build(list(chunks))
+    store.get_index()  # include ANN construction in the build time
+    return store
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(), "embedder": embedder_name(),
+            "index_type": os.getenv("VECTOR_INDEX_TYPE", "flat"), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.2):
+    """List metrics that are more than `tolerance` worse than in `baseline`."""
+    regressions = []
+    old_runs = {r["corpus"]["n_chunks"]: r for r in baseline.get("runs", [])}
+    for run in current.get("runs", []):
+        old = old_runs.get(run["corpus"]["n_chunks"])
+        if old is None:
+            continue
+        for section in ("build", "query", "end_to_end"):
+            for method, stats in run[section].items():
+                for metric in COMPARED:
+                    a = old.get(section, {}).get(method, {}).get(metric)
+                    b = stats.get(metric)
+                    if not a or b is None:
+                        continue
+                    change = (a - b) / a if metric == "qps" else (b - a) / a
+                    if change > tolerance:
+                        regressions.append({"n_chunks": run["corpus"]["n_chunks"], "section": section,
+                                            "method": method, "metric": metric, "baseline": a,
+                                            "current": b, "change": round(change, 3)})
+    return regressions
+
+def print_run(run):
+    print(f"== {run['corpus']['n_chunks']} chunks ({run['corpus']['bytes'] / 2**20:.1f} MB) ==")
+    for name, b in run["build"].items():
+        print(f"build  {name:<7} {b['build_s']:>8.3f}s  rss +{b['rss_delta_mb']:.1f} MB")
+    for section in ("query", "end_to_end"):
+        for m, s in run[section].items():
+            print(f"{section:<10} {m:<7} p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms "
+                  f"p99={s['p99_ms']:.2f}ms qps={s['qps']:.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000], help="Corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--source", default="data/raw", help="Raw text folder the corpus is derived from")
+    parser.add_argument("--index-type", default=None, help="Vector index backend (default VECTOR_INDEX_TYPE)")
+    parser.add_argument("--workdir", help="Where to write the synthetic corpora (default: a temp folder)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    report = {"environment": environment(), "runs": []}
+    for n in args.sizes:
+        workdir = os.path.join(args.workdir, str(n)) if args.workdir else None
+        run = run_benchmark(n, args.queries, methods=args.methods, source=args.source,
+                            workdir=workdir, index_type=args.index_type)
+        print_run(run)
+        report["runs"].append(run)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(json.load(f), report, args.tolerance)
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['n_chunks']} {r['section']}/{r['method']} {r['metric']}: "
+                  f"{r['baseline']} -> {r['current']} ({r['change']:+.0%})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report.get("regressions") else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -7,7 +7,6 @@
 Computes recall@k, precision@k and MRR on a small labeled dataset.
 """
 
-import json
 import math
 from retrieval.retriever import SimpleRetriever, HybridRetriever
 from retrieval.vector_store import build_index, search as vector_search
@@ -81,6 +80,6 @@ def print_metrics(metrics):
             print(v)
 
 if __name__ == '__main__':
-    chunks = json.load(open('data/processed/chunks.json'))
+    chunks = load_documents('data/processed')
     metrics = evaluate(chunks)
     print_metrics(metrics)
@@ -0,0 +1,210 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""Cached evaluation runner for retrieval methods and prompt variants.
+
+- Retrieval: vector queries are embedded and scored in one batch (search_many),
+  the hybrid retriever's expanded queries are pre-embedded in one batch, and
+  queries fan out over a thread pool.
+- Prompts: every (variant, question) prompt is sent concurrently through
+  query_openai_many.
+- Results are stored as structured metrics in SQLite (EVAL_RESULTS_PATH, default
+  data/evaluation/results.sqlite), keyed by (dataset hash, index version,
+  variant). Re-running with unchanged inputs reads the stored metrics without
+  retrieving or answering anything, and the UI only reads them (latest() shows
+  the variants of the most recent run).
+
+    python -m evaluation.runner [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from evaluation.retrieval_evaluation import EVAL_QUERIES, mrr, precision_at_k, recall_at_k
+from evaluation.llm_evaluation import PROMPT_VARIANTS
+from llm.evaluation import simple_metrics
+from llm.query_llm import llm_backend, query_openai_many
+from retrieval.engine import RetrievalEngine
+from retrieval.query_rewrite import expand_query
+from retrieval.vector_store import embed_queries
+
+DEFAULT_RESULTS_PATH = 'data/evaluation/results.sqlite'
+RETRIEVAL_METHODS = ('simple', 'vector', 'hybrid')
+_PROBE_CONTEXT = [{"source": "<source>", "chunk_id": 0, "text": "<context>"}]
+
+def _digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def dataset_hash(queries: List[dict]) -> str:
+    return _digest(queries)[:16]
+
+def index_version(snapshot) -> str:
+    """Identifies what retrieval results depend on: the chunks, the embedding model and the index type."""
+    return _digest([snapshot.chunks_hash, snapshot.store.model_name, snapshot.store.index_type,
+                    snapshot.store.index_params])[:16]
+
+def results_path() -> str:
+    return os.getenv('EVAL_RESULTS_PATH', DEFAULT_RESULTS_PATH)
+
+class EvaluationStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or results_path())
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (kind TEXT NOT NULL, dataset_hash TEXT NOT NULL, "
+                           "index_version TEXT NOT NULL, variant TEXT NOT NULL, created REAL NOT NULL, "
+                           "metrics TEXT NOT NULL, PRIMARY KEY (kind, dataset_hash, index_version, variant))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS runs (created REAL NOT NULL, dataset_hash TEXT NOT NULL, "
+                           "index_version TEXT NOT NULL, variants TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, kind: str, dataset: str, version: str, variant: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT metrics FROM results WHERE kind = ? AND dataset_hash = ? AND "
+                                     "index_version = ? AND variant = ?", (kind, dataset, version, variant)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, kind: str, dataset: str, version: str, variant: str, metrics: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                               (kind, dataset, version, variant, time.time(), json.dumps(metrics)))
+            self._conn.commit()
+
+    def record_run(self, dataset: str, version: str, variants: Dict[str, List[str]]):
+        """Remember which {kind: [variant]} a run reported, for latest()."""
+        with self._lock:
+            self._conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?)", (time.time(), dataset, version, json.dumps(variants)))
+            self._conn.commit()
+
+    def latest(self, version: Optional[str] = None) -> Dict[str, Dict[str, dict]]:
+        """{kind: {variant: metrics}} of the most recent run (for `version` if given):
+        its dataset and its variants only, not older datasets or edited variants."""
+        sql = "SELECT dataset_hash, index_version, variants FROM runs"
+        args = ()
+        if version is not None:
+            sql += " WHERE index_version = ?"
+            args = (version,)
+        with self._lock:
+            run = self._conn.execute(sql + " ORDER BY created DESC LIMIT 1", args).fetchone()
+        if run is None:
+            return {}
+        dataset, ver, variants = run
+        out = {}
+        for kind, names in json.loads(variants).items():
+            for name in names:
+                metrics = self.get(kind, dataset, ver, name)
+                if metrics is not None:
+                    out.setdefault(kind, {})[name] = {**metrics, "dataset_hash": dataset, "index_version": ver}
+        return out
+
+def _summarize(per_query: List[dict]) -> dict:
+    keys = [k for k in per_query[0] if k != "query"] if per_query else []
+    means = {k: sum(r[k] for r in per_query) / len(per_query) for k in keys}
+    return {"mean": means, "queries": per_query}
+
+def retrieval_metrics(snapshot, queries: List[dict], k: int = 5, workers: int = 4) -> Dict[str, dict]:
+    texts = [item["q"] for item in queries]
+    results = {"vector": snapshot.store.search_many(texts, top_k=k)}
+    # The hybrid retriever embeds the expanded query; embed them all in one batch up front
+    if snapshot.store.embeddings is not None and len(snapshot.store.embeddings):
+        embed_queries([expand_query(q) for q in texts])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results["simple"] = list(pool.map(lambda q: snapshot.simple.search(q, k=k), texts))
+        results["hybrid"] = list(pool.map(lambda q: snapshot.hybrid.search(q, k=k), texts))
+    out = {}
+    for method in RETRIEVAL_METHODS:
+        per_query = [{"query": item["q"], "precision@3": precision_at_k(res, item["gt"], k=3),
+                      "recall@3": recall_at_k(res, item["gt"], k=3), "mrr": mrr(res, item["gt"])}
+                     for item, res in zip(queries, results[method])]
+        out[method] = _summarize(per_query)
+    return out
+
+def _keywords(item: dict) -> List[str]:
+    return sorted({w for gt in item["gt"] for w in gt.split() if len(w) > 3})
+
+def prompt_metrics(prompts: Dict[str, List[str]], queries: List[dict]) -> Dict[str, dict]:
+    """`prompts` maps variant -> one prompt per query; all of them are answered concurrently."""
+    names = list(prompts)
+    answers = query_openai_many([p for name in names for p in prompts[name]])
+    out = {}
+    for v, name in enumerate(names):
+        per_query = [{"query": item["q"], **simple_metrics(answers[v * len(queries) + i], _keywords(item))}
+                     for i, item in enumerate(queries)]
+        out[name] = _summarize(per_query)
+    return out
+
+def run_evaluation(engine: Optional[RetrievalEngine] = None, queries: Optional[List[dict]] = None,
+                   variants: Optional[Dict[str, object]] = None, store: Optional[EvaluationStore] = None,
+                   force: bool = False, context_k: int = 3) -> dict:
+    """Evaluate retrieval methods and prompt variants, reusing stored metrics for
+    any (dataset hash, index version, variant) that was already evaluated."""
+    engine = engine or RetrievalEngine()
+    snapshot = engine.snapshot()
+    queries = queries or EVAL_QUERIES
+    variants = variants or PROMPT_VARIANTS
+    store = store or EvaluationStore()
+    dataset, version = dataset_hash(queries), index_version(snapshot)
+    report = {"dataset_hash": dataset, "index_version": version, "retrieval": {}, "prompts": {}, "computed": []}
+
+    retrieval = {m: None if force else store.get("retrieval", dataset, version, m) for m in RETRIEVAL_METHODS}
+    if any(v is None for v in retrieval.values()):
+        retrieval = retrieval_metrics(snapshot, queries)
+        for method, metrics in retrieval.items():
+            store.put("retrieval", dataset, version, method, metrics)
+        report["computed"].append("retrieval")
+    report["retrieval"] = retrieval
+
+    # A variant's key hashes the prompts it builds around a placeholder context,
+    # the context settings and the answering model, so editing a template or
+    # switching from the mock to a real LLM invalidates it; the real contexts
+    # (dataset and index are already in the key) are only retrieved on a miss
+    hybrid = snapshot.hybrid
+    settings = [llm_backend(), context_k, hybrid.fusion, hybrid.alpha, hybrid.rrf_k, hybrid.candidates]
+    keys = {name: f"{name}:{_digest(settings + [fn(item['q'], _PROBE_CONTEXT) for item in queries])[:12]}"
+            for name, fn in variants.items()}
+    results = {name: None if force else store.get("prompt", dataset, version, keys[name]) for name in variants}
+    missing = [name for name, r in results.items() if r is None]
+    if missing:
+        contexts = [hybrid.search(item["q"], k=context_k) for item in queries]
+        prompts = {name: [variants[name](item["q"], ctx) for item, ctx in zip(queries, contexts)] for name in missing}
+        for name, metrics in prompt_metrics(prompts, queries).items():
+            store.put("prompt", dataset, version, keys[name], metrics)
+            results[name] = metrics
+        report["computed"].append("prompts")
+    report["prompts"] = results
+    store.record_run(dataset, version, {"retrieval": list(RETRIEVAL_METHODS), "prompt": [keys[n] for n in variants]})
+    return report
+
+def print_report(report: dict):
+    print(f"dataset={report['dataset_hash']} index={report['index_version']} "
+          f"computed={', '.join(report['computed']) or 'nothing (cached)'}")
+    for kind in ("retrieval", "prompts"):
+        for name, metrics in report[kind].items():
+            means = " ".join(f"{k}={v:.3f}" for k, v in metrics["mean"].items())
+            print(f"{kind:<9} {name:<16} {means}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folder", default="data/processed")
+    parser.add_argument("--queries", help="JSON file with labelled queries [{\"q\": ..., \"gt\": [...]}, ...]")
+    parser.add_argument("--force", action="store_true", help="Recompute even if results are stored")
+    args = parser.parse_args()
+    queries = None
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = json.load(f)
+    print_report(run_evaluation(RetrievalEngine(args.folder), queries=queries, force=args.force))
+
+if __name__ == '__main__':
+    main()
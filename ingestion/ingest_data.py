@@ -5,15 +5,49 @@
 
 """
 Automated ingestion script:
-- Loads text files from --source
-- Cleans and chunks texts
-- Writes chunks to --output/chunks.json
+- Streams text files from --source through the memory-mapped chunker
+  (ingestion/utils.stream_chunks); chunks record character offsets (start, end)
+  into their source file
+- Streams chunks to --output/chunks.jsonl (one JSON object per line, plus an offset index)
+- Embeds chunks and writes the vector index artifact to --output/index/
+- Builds the BM25 sparse index and writes it to --output/bm25.npz
+
+Chunking and embedding run per file, on a process pool when --workers is above
+1 or, by default, when the files to process total at least PARALLEL_MIN_BYTES
+(each pool worker loads its own embedding model, which only pays off on a
+large corpus). A file is chunked and embedded EMBED_BATCH chunks at a time;
+pool workers append each batch to a spool file that the main process streams
+into chunks.jsonl, so no process holds a whole file's chunks and vectors.
+The main process appends each batch's vectors to a spool file as well and
+copies them into a memory-mapped embedding matrix at the end; it keeps only
+source / chunk id / tags per row, never the chunk text.
+With --incremental, a manifest of file content hashes (--output/manifest.json)
+is compared with the source folder and only new or changed files are
+re-chunked and re-embedded; rows of unchanged files are kept as they are.
 """
 
 import argparse
+import hashlib
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
-from ingestion.utils import clean_text, chunk_text
+import numpy as np
+from ingestion.utils import stream_chunks
+from retrieval.ann_index import normalize_rows
+from retrieval.vector_store import InMemoryVectorStore, content_hash, embed_texts, index_is_current, active_model_name
+from retrieval.bm25 import BM25_FILE, BM25Index
+from retrieval.chunk_store import CHUNKS_FILE, LEGACY_CHUNKS_FILE, ChunkWriter, chunks_path, iter_chunks
+
+MANIFEST_FILE = "manifest.json"
+CHUNK_SIZE = 200
+OVERLAP = 50
+PARALLEL_MIN_BYTES = 16 * 2**20
+EMBED_BATCH = 256
+COPY_BLOCK = 65536  # embedding rows copied into the index matrix at a time
+CHUNKER_VERSION = 2  # v2: streaming chunker; consecutive chunks really share OVERLAP words
 
 def load_texts(source_folder: str):
     p = Path(source_folder)
@@ -22,21 +56,155 @@ def load_texts(source_folder: str):
         texts.append({"source": f.name, "text": f.read_text(encoding="utf-8")})
     return texts
 
-def main(source: str, output: str):
-    texts = load_texts(source)
-    chunks = []
-    for doc in texts:
-        cleaned = clean_text(doc["text"])
-        for i, ch in enumerate(chunk_text(cleaned, chunk_size=200, overlap=50)):
-            chunks.append({"source": doc["source"], "chunk_id": i, "text": ch})
+def file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def process_file(path: str, embed: bool = True):
+    """Yield (chunks, embeddings) for consecutive batches of EMBED_BATCH chunks
+    of one file; embeddings is None when `embed` is false."""
+    f = Path(path)
+    batch = []
+    for c in stream_chunks(f, chunk_size=CHUNK_SIZE, overlap=OVERLAP):
+        batch.append(c.to_dict(f.name))
+        if len(batch) == EMBED_BATCH:
+            yield batch, embed_texts([c["text"] for c in batch]) if embed else None
+            batch = []
+    if batch:
+        yield batch, embed_texts([c["text"] for c in batch]) if embed else None
+
+def spool_file(path: str, embed: bool, spool: str) -> str:
+    """Pool worker: append the batches of process_file() to `spool`. The
+    worker loads the embedding model once and reuses it for later files."""
+    with open(spool, 'wb') as out:
+        for batch in process_file(path, embed):
+            pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+    return spool
+
+def _read_spool(spool: str):
+    try:
+        with open(spool, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+    finally:
+        os.remove(spool)
+
+def _run(paths, embed: bool, workers: int, spool_dir: str):
+    """Yield (file name, batches) in input order; a file's batches must be
+    consumed before the next file is taken."""
+    if workers <= 1 or len(paths) <= 1:
+        for p in paths:
+            yield p.name, process_file(str(p), embed)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = [pool.submit(spool_file, str(p), embed, os.path.join(spool_dir, f'{i}.pkl'))
+                   for i, p in enumerate(paths)]
+        for p, future in zip(paths, futures):
+            yield p.name, _read_spool(future.result())
+
+def read_manifest(output: str) -> dict:
+    path = Path(output) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def main(source: str, output: str, build_vectors: bool = True, incremental: bool = False, workers: int = None):
     outp = Path(output)
     outp.mkdir(parents=True, exist_ok=True)
-    outp.joinpath("chunks.json").write_text(json.dumps(chunks, indent=2, ensure_ascii=False))
-    print(f"Ingested {len(chunks)} chunks and wrote to {outp / 'chunks.json'}")
+    files = {f.name: f for f in sorted(Path(source).glob("*.txt"))}
+    manifest = read_manifest(output)
+    settings = {"chunk_size": CHUNK_SIZE, "overlap": OVERLAP, "chunker": CHUNKER_VERSION,
+                "model": active_model_name() if build_vectors else None}
+
+    # Reuse previous rows only if the previous outputs match the manifest and settings
+    reuse = incremental and manifest.get("settings") == settings and chunks_path(output).exists()
+    if reuse and build_vectors and not index_is_current(output, content_hash(chunks_path(output))):
+        reuse = False
+    known = {name: meta["sha256"] for name, meta in manifest.get("files", {}).items()} if reuse else {}
+
+    current = {name: file_digest(f) for name, f in files.items()}
+    changed = [name for name in files if known.get(name) != current[name]]
+    removed = [name for name in known if name not in files]
+    if reuse and not changed and not removed and (outp / BM25_FILE).exists():
+        # Leave every output untouched: rewriting them would make readers reload for nothing
+        print(f"Nothing to ingest: {len(files)} files unchanged in {outp}")
+        return
+    stale = set(changed) | set(removed)
+    old = InMemoryVectorStore.load(output) if reuse and build_vectors else None
+    if workers is None:
+        size = sum(files[n].stat().st_size for n in changed)
+        workers = (os.cpu_count() or 1) if len(changed) > 1 and size >= PARALLEL_MIN_BYTES else 1
+
+    # Chunks are streamed to disk as they are produced, and so are the new rows'
+    # embeddings; only per-row metadata (no text, no vectors) is kept in memory
+    counts = {}
+    digests = {n: known[n] for n in files if n not in stale}
+    keep = np.array([i for i, s in enumerate(old.sources) if s not in stale] if old is not None else [], dtype='int64')
+    rows = [_row_meta(old.sources[i], old.chunk_ids[i], old.tags[i]) for i in keep.tolist()]
+    n_new, dim = 0, old.embeddings.shape[1] if len(keep) else 0
+    with tempfile.TemporaryDirectory(prefix='spool-', dir=outp) as spool_dir:
+        new_path = os.path.join(spool_dir, 'embeddings.f32')
+        with ChunkWriter(output) as writer, open(new_path, 'wb') as new_vectors:
+            if reuse:
+                for c in iter_chunks(output):
+                    if c["source"] not in stale:
+                        writer.write(c)
+                        counts[c["source"]] = counts.get(c["source"], 0) + 1
+            for name, batches in _run([files[n] for n in changed], build_vectors, workers, spool_dir):
+                counts[name] = 0
+                for batch, embeddings in batches:
+                    writer.write_many(batch)
+                    counts[name] += len(batch)
+                    if build_vectors:
+                        rows += [_row_meta(c["source"], c["chunk_id"], c.get("tags")) for c in batch]
+                        normalize_rows(embeddings).tofile(new_vectors)
+                        n_new, dim = n_new + len(batch), embeddings.shape[1]
+                digests[name] = current[name]
+        (outp / LEGACY_CHUNKS_FILE).unlink(missing_ok=True)
+        n_chunks = len(writer)
+        print(f"Ingested {n_chunks} chunks ({len(changed)} new/changed, {len(removed)} removed, "
+              f"{len(files) - len(changed)} unchanged files) and wrote to {outp / CHUNKS_FILE}")
+        chunks_hash = content_hash(outp / CHUNKS_FILE)
+        if build_vectors and n_chunks:
+            # Kept rows first, then the new ones: the order they were written to chunks.jsonl
+            embeddings = np.lib.format.open_memmap(os.path.join(spool_dir, 'embeddings.npy'), mode='w+',
+                                                   dtype='float32', shape=(len(rows), dim))
+            for a in range(0, len(keep), COPY_BLOCK):
+                embeddings[a:a + COPY_BLOCK] = old.embeddings[keep[a:a + COPY_BLOCK]]
+            if n_new:
+                new = np.memmap(new_path, dtype='float32', mode='r', shape=(n_new, dim))
+                for a in range(0, n_new, COPY_BLOCK):
+                    embeddings[len(keep) + a:len(keep) + a + COPY_BLOCK] = new[a:a + COPY_BLOCK]
+                del new
+            store = InMemoryVectorStore()
+            store.build(rows, chunks_hash=chunks_hash, embeddings=embeddings, normalized=True)
+            store.save(output)
+            del store, embeddings
+            print(f"Wrote vector index to {outp / 'index'}")
+    if n_chunks:
+        BM25Index.build(iter_chunks(output), chunks_hash=chunks_hash).save(output)
+        print(f"Wrote BM25 index to {outp / 'bm25.npz'}")
+    outp.joinpath(MANIFEST_FILE).write_text(json.dumps({
+        "settings": settings,
+        "files": {n: {"sha256": digests[n], "chunks": counts.get(n, 0)} for n in sorted(digests)},
+    }, indent=2))
+
+def _row_meta(source: str, chunk_id, tags) -> dict:
+    return {"source": source, "chunk_id": chunk_id, **({"tags": tags} if tags else {})}
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--source", default="data/raw", help="Source folder with raw text files")
-    parser.add_argument("--output", default="data/processed", help="Output folder for chunks.json")
+    parser.add_argument("--output", default="data/processed", help="Output folder for chunks.jsonl and the indexes")
+    parser.add_argument("--skip-index", action="store_true", help="Do not build the vector index artifact")
+    parser.add_argument("--incremental", action="store_true", help="Only re-process new or changed files (uses manifest.json)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for chunking/embedding (default: in-process for small corpora, "
+                             "one per CPU from 16 MB of changed files)")
     args = parser.parse_args()
-    main(args.source, args.output)
+    main(args.source, args.output, build_vectors=not args.skip_index, incremental=args.incremental, workers=args.workers)
@@ -8,22 +8,129 @@
 Ingestion utilities.
 All comments and docstrings are in English.
 
-"""
+stream_chunks() chunks a UTF-8 file without loading it: the file is memory-mapped,
+a bounded block of it is decoded at each chunk start and the window of
+`chunk_size` words is found with one regex match on the decoded text (so words
+split on the same Unicode whitespace as str.split()); the block grows only when
+a window does not fit in it. The chunks carry character offsets into the file.
+A chunk's (whitespace-normalised) text is only read when it is accessed, so
+memory stays bounded by a few chunks whatever the file size.
 
+"""
 
+import mmap
+import os
+import re
+from functools import lru_cache
+from typing import Iterator, Optional
 
+_WORD = re.compile(r"\S+")
+_MIN_BLOCK = 4096
 
 def clean_text(text: str) -> str:
     """Normalize whitespace and remove excessive newlines."""
     return " ".join(text.replace("\r", "\n").split())
 
+def _check_window(chunk_size: int, overlap: int):
+    if chunk_size < 1 or not 0 <= overlap < chunk_size:
+        raise ValueError(f"need chunk_size >= 1 and 0 <= overlap < chunk_size (got {chunk_size}, {overlap})")
+
 def chunk_text(text: str, chunk_size: int = 200, overlap: int = 50):
-    """Split text into word-based chunks with specified overlap."""
+    """Split text into word-based chunks; consecutive chunks share `overlap` words."""
+    _check_window(chunk_size, overlap)
     words = text.split()
     chunks = []
     start = 0
     while start < len(words):
         end = min(start + chunk_size, len(words))
         chunks.append(" ".join(words[start:end]))
-        start = max(end - overlap, end)
+        if end == len(words):
+            break
+        start = end - overlap
     return chunks
+
+@lru_cache(maxsize=16)
+def _window(chunk_size: int):
+    return re.compile(r"\S+(?:\s+\S+){0,%d}" % (chunk_size - 1))
+
+@lru_cache(maxsize=16)
+def _skip(n_words: int):
+    return re.compile(r"(?:\S+\s+){%d}" % n_words)
+
+def _decode(buf, start: int, size: int):
+    """Up to `size` bytes of `buf` from `start`, cut at a character boundary,
+    decoded; and whether the block reaches the end of `buf`."""
+    end = min(start + size, len(buf))
+    while start < end < len(buf) and buf[end] & 0xC0 == 0x80:
+        end -= 1  # do not split a multi-byte character
+    return buf[start:end].decode("utf-8"), end == len(buf)
+
+def _n_bytes(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+class Chunk:
+    """A chunk of a source file: characters [start, end) of its text. The text
+    is read from the file (or its open memory map) when first accessed."""
+    __slots__ = ("path", "chunk_id", "start", "end", "byte_start", "byte_end", "_buf")
+
+    def __init__(self, path: str, chunk_id: int, start: int, end: int, byte_start: int, byte_end: int, buf=None):
+        self.path = path
+        self.chunk_id = chunk_id
+        self.start = start
+        self.end = end
+        self.byte_start = byte_start
+        self.byte_end = byte_end
+        self._buf = buf
+
+    @property
+    def text(self) -> str:
+        if self._buf is not None and not self._buf.closed:
+            data = self._buf[self.byte_start:self.byte_end]
+        else:
+            with open(self.path, "rb") as f:
+                f.seek(self.byte_start)
+                data = f.read(self.byte_end - self.byte_start)
+        return clean_text(data.decode("utf-8"))
+
+    def to_dict(self, source: Optional[str] = None) -> dict:
+        return {"source": source or os.path.basename(self.path), "chunk_id": self.chunk_id, "text": self.text,
+                "start": self.start, "end": self.end}
+
+def stream_chunks(path, chunk_size: int = 200, overlap: int = 50) -> Iterator[Chunk]:
+    """Yield the chunks of a UTF-8 text file; same words per chunk as
+    chunk_text(clean_text(file contents)), but without reading the file into memory."""
+    _check_window(chunk_size, overlap)
+    path = str(path)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            start = char_start = chunk_id = 0  # byte and character offset of the next chunk
+            size = max(_MIN_BLOCK, 16 * chunk_size)
+            window, skip = _window(chunk_size), _skip(chunk_size - overlap)
+            text, eof = _decode(buf, 0, size)
+            first = _WORD.search(text)
+            while first is None:
+                if eof:
+                    return  # only whitespace
+                start += _n_bytes(text)
+                char_start += len(text)
+                text, eof = _decode(buf, start, size)
+                first = _WORD.search(text)
+            start += _n_bytes(text[:first.start()])
+            char_start += first.start()
+            while True:
+                text, eof = _decode(buf, start, size)
+                end = window.match(text).end()
+                more = _WORD.search(text, end) is not None
+                if not (more or eof):
+                    size *= 2  # the window may continue past the block
+                    continue
+                yield Chunk(path, chunk_id, char_start, char_start + end, start, start + _n_bytes(text[:end]), buf)
+                if not more:
+                    return
+                # The window was full (more words follow); step forward chunk_size - overlap words
+                step = skip.match(text).end()
+                start += _n_bytes(text[:step])
+                char_start += step
+                chunk_id += 1
@@ -0,0 +1,246 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""
+Headless HTTP API (ASGI, FastAPI) over the same pipeline as the Streamlit app:
+- GET  /health        index version and size
+- POST /retrieve      {"query", "method", "k", "filters"} -> ranked chunks with source and chunk_id
+- POST /answer        {"query", "method", "k", "context_k", "filters"} -> answer + sources + context token stats
+- POST /answer:batch  {"queries", ...} -> one answer per query, in order
+
+`filters` restricts retrieval before scoring, e.g. {"source": "nhs_*"}
+(see retrieval/metadata.py).
+
+Retrieval, reranking and context building run on a bounded thread pool and
+LLM calls on the async client, so one process serves many requests concurrently. Every request has a deadline
+(504 when exceeded); once all workers are busy and the wait queue is full,
+new requests are rejected with 503 + Retry-After instead of piling up. An LLM
+call that fails after retries is a 502, never a mocked answer.
+
+Run: uvicorn interface.api:app --host 0.0.0.0 --port 8000
+Environment: API_DATA_FOLDER, API_WORKERS, API_QUEUE_SIZE, API_REQUEST_TIMEOUT, API_MAX_BATCH.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+from retrieval.engine import METHODS, RetrievalEngine
+from retrieval.rerank import get_reranker
+from llm.context import warm_up as warm_up_tokenizer
+from llm.prompt_templates import compose_prompt
+from llm.client import LLMError
+from llm.query_llm import aquery_openai
+
+try:
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+except Exception:
+    FastAPI = None  # optional: only needed to serve the API, not to use AssistantService
+
+class Overloaded(RuntimeError):
+    """All workers are busy and the wait queue is full (HTTP 503)."""
+
+class RequestTimeout(RuntimeError):
+    """The request did not finish within its deadline (HTTP 504)."""
+
+class WorkerPool:
+    """Admission control for async handlers: at most `workers` requests run at
+    once and at most `queue_size` more wait for a slot; the rest are rejected.
+    Blocking work (index search) runs on a thread pool of the same size."""
+    def __init__(self, workers: int = 8, queue_size: int = 64, timeout: float = 30.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+        self._slots = None
+        self._loop = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def submit(self, coro_fn: Callable, timeout: Optional[float] = None):
+        """Run `coro_fn()` under the concurrency limit and the request deadline
+        (time spent waiting for a slot counts towards the deadline)."""
+        if self._pending >= self.workers + self.queue_size:
+            raise Overloaded(f'{self._pending} requests in flight')
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # The semaphore belongs to the loop that serves the requests
+            self._slots, self._loop = asyncio.Semaphore(self.workers), loop
+        self._pending += 1
+        try:
+            return await asyncio.wait_for(self._run(coro_fn), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise RequestTimeout(f'request exceeded {timeout or self.timeout:.1f}s')
+        finally:
+            self._pending -= 1
+
+    async def _run(self, coro_fn: Callable):
+        async with self._slots:
+            return await coro_fn()
+
+    async def run_blocking(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+class AssistantService:
+    """Framework-independent request handlers; create_app() maps them to routes."""
+    def __init__(self, engine: Optional[RetrievalEngine] = None, folder: Optional[str] = None,
+                 pool: Optional[WorkerPool] = None, max_batch: Optional[int] = None):
+        self.folder = folder or os.getenv('API_DATA_FOLDER', 'data/processed')
+        self.pool = pool or WorkerPool(workers=int(os.getenv('API_WORKERS', '8')),
+                                       queue_size=int(os.getenv('API_QUEUE_SIZE', '64')),
+                                       timeout=float(os.getenv('API_REQUEST_TIMEOUT', '30')))
+        self.max_batch = max_batch or int(os.getenv('API_MAX_BATCH', '32'))
+        self._engine = engine
+        self._engine_lock = threading.Lock()
+
+    @property
+    def engine(self) -> RetrievalEngine:
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = RetrievalEngine(self.folder)
+        return self._engine
+
+    @staticmethod
+    def _check(query: str, method: str, k: int, filters: Optional[dict] = None, context_k: Optional[int] = None):
+        if not query or not query.strip():
+            raise ValueError('query must not be empty')
+        if method not in METHODS:
+            raise ValueError(f'method must be one of {", ".join(METHODS)}')
+        if not 1 <= k <= 50:
+            raise ValueError('k must be between 1 and 50')
+        if context_k is not None and not 1 <= context_k <= 20:
+            raise ValueError('context_k must be between 1 and 20')
+        if filters is not None and not isinstance(filters, dict):
+            raise ValueError('filters must be an object, e.g. {"source": "nhs_*"}')
+
+    def _retrieve(self, query: str, method: str, k: int, filters: Optional[dict] = None):
+        return self.engine.search(query, method=method, k=k, filters=filters)
+
+    @staticmethod
+    def _rerank(query: str, results: list):
+        try:
+            return get_reranker().rerank(query, results)
+        except Exception:
+            return results
+
+    def _prepare(self, query: str, results: list, context_k: int):
+        """Rerank `results` and build the prompt from the top `context_k`.
+        Returns (reranked, prompt, context stats)."""
+        reranked = self._rerank(query, results)
+        context = {}
+        prompt = compose_prompt(query, reranked[:context_k], stats=context)
+        return reranked, prompt, context
+
+    async def _answer(self, query: str, method: str, k: int, context_k: int, timeout: Optional[float],
+                      filters: Optional[dict] = None):
+        results = await self.pool.run_blocking(self._retrieve, query, method, k, filters)
+        # Reranking (model inference, or waiting out the rerank budget) and context
+        # building (token counting, dedup, truncation) block: keep them off the event loop
+        reranked, prompt, context = await self.pool.run_blocking(self._prepare, query, results, context_k)
+        answer = await aquery_openai(prompt, timeout=timeout)
+        return {"query": query, "answer": answer, "sources": reranked[:context_k], "context": context}
+
+    async def health(self) -> dict:
+        engine = await self.pool.run_blocking(lambda: self.engine)
+        return {"status": "ok", "chunks": len(engine), "version": engine.version, "pending": self.pool.pending}
+
+    async def retrieve(self, query: str, method: str = 'hybrid', k: int = 5, filters: Optional[dict] = None) -> dict:
+        self._check(query, method, k, filters)
+        async def run():
+            return await self.pool.run_blocking(self._retrieve, query, method, k, filters)
+        return {"query": query, "method": method, "results": await self.pool.submit(run)}
+
+    async def answer(self, query: str, method: str = 'hybrid', k: int = 5, context_k: int = 3,
+                     filters: Optional[dict] = None) -> dict:
+        self._check(query, method, k, filters, context_k)
+        return await self.pool.submit(lambda: self._answer(query, method, k, context_k, self.pool.timeout, filters))
+
+    async def answer_batch(self, queries: List[str], method: str = 'hybrid', k: int = 5, context_k: int = 3,
+                           filters: Optional[dict] = None) -> dict:
+        """One admission slot for the whole batch; its queries run concurrently."""
+        if not queries:
+            raise ValueError('queries must not be empty')
+        if len(queries) > self.max_batch:
+            raise ValueError(f'at most {self.max_batch} queries per batch')
+        for q in queries:
+            self._check(q, method, k, filters, context_k)
+        async def run():
+            return await asyncio.gather(*[self._answer(q, method, k, context_k, self.pool.timeout, filters)
+                                          for q in queries])
+        return {"answers": await self.pool.submit(run)}
+
+def create_app(service: Optional[AssistantService] = None):
+    if FastAPI is None:
+        raise RuntimeError('FastAPI is not installed: pip install fastapi uvicorn')
+    service = service or AssistantService()
+
+    class RetrieveRequest(BaseModel):
+        query: str
+        method: str = 'hybrid'
+        k: int = 5
+        filters: Optional[Dict[str, object]] = None
+
+    class AnswerRequest(RetrieveRequest):
+        context_k: int = 3
+
+    class BatchRequest(BaseModel):
+        queries: List[str]
+        method: str = 'hybrid'
+        k: int = 5
+        context_k: int = 3
+        filters: Optional[Dict[str, object]] = None
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Load the indexes and the context tokenizer before accepting traffic
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: service.engine)
+        await loop.run_in_executor(None, warm_up_tokenizer)
+        yield
+        service.pool.shutdown()
+
+    app = FastAPI(title='Mental Health RAG Assistant API', lifespan=lifespan)
+    app.state.service = service
+
+    async def call(coro):
+        try:
+            return await coro
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=f'Server busy: {e}', headers={'Retry-After': '1'})
+        except RequestTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except LLMError as e:
+            raise HTTPException(status_code=502, detail=f'LLM call failed: {e}')
+
+    @app.get('/health')
+    async def health():
+        return await service.health()
+
+    @app.post('/retrieve')
+    async def retrieve(req: RetrieveRequest):
+        return await call(service.retrieve(req.query, req.method, req.k, req.filters))
+
+    @app.post('/answer')
+    async def answer(req: AnswerRequest):
+        return await call(service.answer(req.query, req.method, req.k, req.context_k, req.filters))
+
+    @app.post('/answer:batch')
+    async def answer_batch(req: BatchRequest):
+        return await call(service.answer_batch(req.queries, req.method, req.k, req.context_k, req.filters))
+
+    return app
+
+app = create_app() if FastAPI is not None else None
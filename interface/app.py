@@ -7,106 +7,119 @@
 Streamlit UI enhanced:
 - select retrieval method (simple, vector, hybrid)
 - shows which method was used
-- displays evaluation summaries by importing evaluation scripts
+- displays stored evaluation summaries (evaluation/runner.py)
 """
 
 import streamlit as st
-import json, io, sys
-from utils import load_documents, save_feedback
-from retrieval.retriever import SimpleRetriever, HybridRetriever
-from retrieval.vector_store import build_index, search as vector_search
-from retrieval.rerank import rerank_by_overlap
+from utils import save_feedback
+from retrieval.embeddings import warm_up
+from retrieval.engine import METHODS, RetrievalEngine
+from retrieval.rerank import get_reranker
+from llm import context
 from llm.prompt_templates import compose_prompt
-from llm.query_llm import query_openai
-import evaluation.retrieval_evaluation as re_eval
-import evaluation.llm_evaluation as llm_eval
+from llm.client import LLMError
+from llm.query_llm import stream_openai
+import evaluation.runner as eval_runner
 
 st.set_page_config(page_title='Mental Health RAG Assistant', layout='wide')
 st.title('🧠 Mental Health RAG Assistant (Enhanced)')
 
-# Load chunks
-chunks = []
-try:
-    chunks = load_documents('data/processed')
-except Exception:
-    try:
-        with open('data/processed/chunks.json','r',encoding='utf-8') as f:
-            chunks = json.load(f)
-    except Exception:
-        chunks = []
+@st.cache_resource(show_spinner='Loading embedding model...')
+def warm_up_embedder():
+    # One shared model per process, loaded before the first query needs it
+    return warm_up()
+
+@st.cache_resource(show_spinner='Loading tokenizer...')
+def warm_up_tokenizer():
+    return context.warm_up()
+
+@st.cache_resource(show_spinner='Loading indexes...')
+def get_engine():
+    # One engine per process, shared by every session. It owns the chunk store,
+    # the vector and BM25 indexes and the retrievers, and swaps them atomically
+    # (in the background) when ingestion writes a new chunk file.
+    return RetrievalEngine('data/processed')
+
+@st.cache_resource
+def get_eval_store():
+    # One connection per process to the results database the runner writes to
+    return eval_runner.EvaluationStore()
+
+warm_up_embedder()
+warm_up_tokenizer()
+engine = get_engine()
 
-if not chunks:
+if not len(engine):
     st.warning('No processed data found. Run ingestion first (ingestion/ingest_data.py).')
 
 # Retrieval method selection
-method = st.sidebar.selectbox('Retrieval method', ['hybrid','vector','simple'], index=0)
+method = st.sidebar.selectbox('Retrieval method', list(METHODS), index=0)
 st.sidebar.markdown('Select retrieval method to use for the next query.')
+sources = st.sidebar.multiselect('Restrict to sources', engine.sources())
+filters = {'source': sources} if sources else None
 
 # Query input
 query = st.text_input('Ask a question:')
 if query:
     st.write('Selected retrieval method:', method.upper())
-    build_index(chunks)
-    if method == 'simple':
-        r = SimpleRetriever(chunks)
-        results = r.search(query, k=5)
-    elif method == 'vector':
-        results = vector_search(query, top_k=5)
-    else:
-        r = HybridRetriever(chunks)
-        results = r.search(query, k=5)
-
-    # Attempt reranking for better ordering (if candidates are dicts)
+    results = engine.search(query, method=method, k=5, filters=filters)
+
+    # Rerank candidates (token-set overlap, or a cross-encoder within RERANK_BUDGET_MS)
     try:
-        reranked = rerank_by_overlap(results, query)
+        reranked = get_reranker().rerank(query, results)
     except Exception:
         reranked = results
 
-    # Build prompt from top-3
-    prompt = compose_prompt(query, reranked[:3] if reranked else [])
-    answer = query_openai(prompt)
+    # Build prompt from top-3 (merged, deduplicated and within CONTEXT_TOKEN_BUDGET)
+    context_stats = {}
+    prompt = compose_prompt(query, reranked[:3] if reranked else [], stats=context_stats)
 
-    st.subheader('Answer')
-    st.write(answer)
+    # Reserve the answer slot above the sources, render the sources as soon as
+    # retrieval is done, then stream the answer into the reserved slot.
+    answer_box = st.container()
 
     st.subheader('Top source snippets')
     for i, c in enumerate(reranked[:5]):
         st.write(f"{i+1}. {c.get('text', c)[:350]}")
+        if c.get('source'):
+            st.caption(f"Source: {c['source']} · chunk {c.get('chunk_id')}")
+
+    with answer_box:
+        st.subheader('Answer')
+        stream_stats = {}
+        try:
+            answer = st.write_stream(stream_openai(prompt, stats=stream_stats))
+        except LLMError as e:
+            answer = ''
+            st.error(f'The language model is unavailable, please try again later ({e}).')
+        if stream_stats.get('ttft_s') is not None:
+            st.caption(f"Time to first token: {stream_stats['ttft_s'] * 1000:.0f} ms · total: {stream_stats['total_s'] * 1000:.0f} ms")
+        if context_stats.get('tokens_saved'):
+            st.caption(f"Context: {context_stats['tokens']} tokens ({context_stats['tokens_saved']} saved by merging, "
+                       f"deduplication and the token budget)")
 
     rating = st.sidebar.slider('Rate this answer (1-5)', 1, 5, 4)
     if st.button('Submit feedback'):
-        save_feedback(query, answer, 'Yes' if rating >=4 else 'No', rating=rating, source_snippet=(reranked[0].get('text')[:200] if reranked else ''))
+        top = reranked[0] if reranked else {}
+        save_feedback(query, answer, 'Yes' if rating >=4 else 'No', rating=rating,
+                      source_snippet=top.get('text', '')[:200],
+                      source=f"{top['source']}#{top.get('chunk_id')}" if top.get('source') else None)
         st.success('Feedback saved!')
 
-# Evaluation summary section
+# Evaluation summary section: reads stored metrics; the runner only recomputes
+# what changed (dataset, index version or prompt variant)
 st.sidebar.markdown('---')
-if st.sidebar.button('Show evaluation summary'):
-    # Capture stdout from evaluation scripts
-    buf = io.StringIO()
-    orig_stdout = sys.stdout
-    try:
-        sys.stdout = buf
-        # run retrieval evaluation (prints metrics)
-        try:
-            re_eval_main = getattr(re_eval, 'evaluate', None)
-            if callable(re_eval_main):
-                metrics = re_eval_main(load_documents('data/processed'))
-                # pretty print metrics
-                import pprint
-                pprint.pprint(metrics)
-            else:
-                # fallback to running as script
-                import runpy
-                runpy.run_module('evaluation.retrieval_evaluation', run_name='__main__')
-        except Exception as e:
-            print('Retrieval evaluation failed:', e)
-        # run llm evaluation
-        try:
-            import runpy
-            runpy.run_module('evaluation.llm_evaluation', run_name='__main__')
-        except Exception as e:
-            print('LLM evaluation failed:', e)
-    finally:
-        sys.stdout = orig_stdout
-    st.subheader('Evaluation Summary (logs)')
-    st.text(buf.getvalue())
+show_eval = st.sidebar.button('Show evaluation summary')
+rerun_eval = st.sidebar.button('Re-run evaluation')
+if show_eval or rerun_eval:
+    if rerun_eval:
+        with st.spinner('Running evaluation...'):
+            eval_runner.run_evaluation(engine, store=get_eval_store())
+    stored = get_eval_store().latest(eval_runner.index_version(engine.snapshot()))
+    st.subheader('Evaluation Summary')
+    if not stored:
+        st.info('No stored results for the current index. Click "Re-run evaluation" or run python -m evaluation.runner.')
+    for kind, title in (('retrieval', 'Retrieval methods'), ('prompt', 'Prompt variants')):
+        if kind in stored:
+            st.markdown(f'**{title}**')
+            st.table({name: m['mean'] for name, m in stored[kind].items()})
@@ -0,0 +1,194 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""Token-budgeted context assembly for prompts.
+
+build_context() turns retrieved chunks (best first, as returned by retrieval or
+a reranker) into the passages that go into the prompt:
+- chunks of the same source that are adjacent (consecutive chunk ids) or whose
+  texts overlap are merged into one passage, without repeating the overlap
+- repeated hits of the same chunk, and passages that are near-duplicates of a
+  better-ranked passage (at least `dedup_threshold` of the smaller passage's
+  word 3-grams also occur in the other), are dropped
+- passages are ordered by rank (a merged passage takes its best member's rank)
+  and added until CONTEXT_TOKEN_BUDGET tokens are used (default 1500; 0 means
+  no limit); a passage that does not fit is cut at a word boundary if at least
+  MIN_PASSAGE_TOKENS still fit, and skipped otherwise
+
+Tokens are counted with tiktoken when it is installed, using the encoding named
+by CONTEXT_TOKENIZER (default cl100k_base; "estimate" disables tiktoken), else
+estimated as words plus punctuation marks. tiktoken may download the encoding
+on first use: call warm_up() at server start so no request waits for it.
+"""
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None  # optional; token counts fall back to an estimate
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_TOKENIZER = "cl100k_base"
+MIN_PASSAGE_TOKENS = 32
+MIN_OVERLAP_WORDS = 5
+SEPARATOR = "\n\n---\n\n"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+_encoding_lock = threading.Lock()
+
+def tokenizer_name() -> str:
+    return os.getenv("CONTEXT_TOKENIZER", DEFAULT_TOKENIZER)
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                name = tokenizer_name()
+                try:
+                    _encoding = tiktoken.get_encoding(name) if tiktoken is not None and name != "estimate" else False
+                except Exception:
+                    _encoding = False  # e.g. the encoding file cannot be downloaded
+    return _encoding or None
+
+def warm_up() -> str:
+    """Load the tokenizer now; returns the encoding name, or "estimate"."""
+    enc = _get_encoding()
+    return enc.name if enc is not None else "estimate"
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text))
+    return len(_TOKEN_RE.findall(text))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of `text` ending at a word boundary with at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    enc = _get_encoding()
+    if enc is not None:
+        ids = enc.encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        cut = enc.decode(ids[:max_tokens])
+        if not text[len(cut):len(cut) + 1].isspace() and " " in cut:
+            cut = cut.rsplit(None, 1)[0]  # drop the word the cut split in two
+        return cut
+    matches = list(_TOKEN_RE.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    return text[:matches[max_tokens - 1].end()]
+
+def token_budget() -> int:
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+def _text(c) -> str:
+    return c.get("text", "") if isinstance(c, dict) else c
+
+def _overlap(left: List[str], right: List[str]) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (in words)."""
+    for k in range(min(len(left), len(right)), MIN_OVERLAP_WORDS - 1, -1):
+        if left[-k:] == right[:k]:
+            return k
+    return 0
+
+def _shingles(words: List[str], n: int = 3) -> frozenset:
+    # Case and punctuation do not make a passage different
+    words = re.findall(r"\w+", " ".join(words).lower())
+    if len(words) <= n:
+        return frozenset([tuple(words)])
+    return frozenset(tuple(words[i:i + n]) for i in range(len(words) - n + 1))
+
+class _Passage:
+    __slots__ = ("rank", "source", "chunk_ids", "words", "text")
+
+    def __init__(self, rank: int, source, chunk_id, text: str):
+        self.rank = rank
+        self.source = source
+        self.chunk_ids = [chunk_id]
+        self.words = text.split()
+        self.text = text
+
+    def absorb(self, rank: int, chunk_id, words: List[str]) -> bool:
+        """Append the next chunk of the same document if it continues this passage."""
+        last = self.chunk_ids[-1]
+        k = _overlap(self.words, words)
+        if not k and not (chunk_id is not None and last is not None and chunk_id == last + 1):
+            return False
+        self.words = self.words + words[k:]
+        self.text = " ".join(self.words)
+        self.chunk_ids.append(chunk_id)
+        self.rank = min(self.rank, rank)
+        return True
+
+def _merge(chunks) -> Tuple[List[_Passage], int]:
+    """Passages in rank order, and the number of repeated (source, chunk_id) hits skipped."""
+    by_source, passages, seen, repeats = {}, [], set(), 0
+    for rank, c in enumerate(chunks):
+        source = c.get("source") if isinstance(c, dict) else None
+        chunk_id = c.get("chunk_id") if isinstance(c, dict) else None
+        if source is None:
+            passages.append(_Passage(rank, None, chunk_id, _text(c)))
+            continue
+        if chunk_id is not None:
+            if (source, chunk_id) in seen:
+                repeats += 1
+                continue
+            seen.add((source, chunk_id))
+        by_source.setdefault(source, []).append((rank, chunk_id, _text(c)))
+    for source, items in by_source.items():
+        # Document order, so a merged passage reads as continuous text
+        items.sort(key=lambda it: (it[1] is None, it[1] or 0, it[0]))
+        current = None
+        for rank, chunk_id, text in items:
+            if current is None or not current.absorb(rank, chunk_id, text.split()):
+                current = _Passage(rank, source, chunk_id, text)
+                passages.append(current)
+    passages.sort(key=lambda p: p.rank)
+    return passages, repeats
+
+def build_context(chunks, budget: Optional[int] = None, dedup_threshold: float = 0.8) -> Tuple[List[dict], dict]:
+    """Merge, deduplicate and budget `chunks` (best first). Returns the passages
+    ({"text", "source", "chunk_ids"}, best first) and stats on what was saved."""
+    budget = token_budget() if budget is None else budget
+    chunks = [c for c in chunks if _text(c).strip()]
+    sep_tokens = count_tokens(SEPARATOR)
+    tokens_in = sum(count_tokens(_text(c)) for c in chunks) + sep_tokens * max(len(chunks) - 1, 0)
+    stats = {"chunks": len(chunks), "merged": 0, "duplicates": 0, "truncated": 0, "dropped": 0,
+             "budget": budget, "tokens_in": tokens_in}
+
+    merged, stats["duplicates"] = _merge(chunks)
+    passages, kept_shingles = [], []
+    for p in merged:
+        stats["merged"] += len(p.chunk_ids) - 1
+        shingles = _shingles(p.words)
+        if any(len(shingles & s) >= dedup_threshold * min(len(shingles), len(s)) for s in kept_shingles):
+            stats["duplicates"] += 1
+            continue
+        kept_shingles.append(shingles)
+        passages.append({"text": p.text, "source": p.source, "chunk_ids": p.chunk_ids})
+
+    out, used = [], 0
+    for p in passages:
+        cost = count_tokens(p["text"]) + (sep_tokens if out else 0)
+        if budget <= 0 or used + cost <= budget:
+            out.append(p)
+            used += cost
+            continue
+        room = budget - used - (sep_tokens if out else 0)
+        if room >= MIN_PASSAGE_TOKENS:
+            p = {**p, "text": truncate_tokens(p["text"], room)}
+            out.append(p)
+            used += count_tokens(p["text"]) + (sep_tokens if len(out) > 1 else 0)
+            stats["truncated"] += 1
+        else:
+            stats["dropped"] += 1
+    stats.update(passages=len(out), tokens=used, tokens_saved=max(tokens_in - used, 0))
+    return out, stats
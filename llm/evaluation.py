@@ -5,19 +5,17 @@
 
 """
 LLM evaluation helpers.
-- run_prompt_comparison: runs multiple prompts and collects outputs
+- run_prompt_comparison: runs multiple prompts concurrently and collects outputs
 - simple_metrics: counts keyword hits and returns length-based metrics
 """
 
-from llm.query_llm import query_openai
+from llm.query_llm import query_openai_many
 
 def run_prompt_comparison(question, context_chunks, prompt_fns):
-    results = {}
-    for name, fn in prompt_fns.items():
-        prompt = fn(question, context_chunks)
-        out = query_openai(prompt)
-        results[name] = out
-    return results
+    names = list(prompt_fns)
+    prompts = [prompt_fns[name](question, context_chunks) for name in names]
+    outputs = query_openai_many(prompts)
+    return dict(zip(names, outputs))
 
 def simple_metrics(output, expected_keywords=None):
     expected_keywords = expected_keywords or []
@@ -5,10 +5,22 @@
 
 """
 Prompt templates for the assistant. Keep prompts safe and non-diagnostic.
+The context is assembled by llm/context.py within CONTEXT_TOKEN_BUDGET tokens.
 """
+from typing import Optional
+from llm.context import SEPARATOR, build_context
+from monitoring.tracing import count, traced
 
-def compose_prompt(question: str, context_chunks):
-    context_text = "\n\n---\n\n".join([c["text"] for c in context_chunks])
+@traced("prompt.compose")
+def compose_prompt(question: str, context_chunks, budget: Optional[int] = None, stats: Optional[dict] = None):
+    """Prompt for `question` over `context_chunks` (best first). Pass a dict as
+    `stats` to receive the context token counts (see build_context)."""
+    passages, context_stats = build_context(context_chunks, budget=budget)
+    count("prompt.context_tokens", context_stats["tokens"])
+    count("prompt.context_tokens_saved", context_stats["tokens_saved"])
+    if stats is not None:
+        stats.update(context_stats)
+    context_text = SEPARATOR.join(p["text"] for p in passages)
     prompt = f"""You are a helpful, evidence-based assistant that provides non-diagnostic mental health information.
 Use the provided context excerpts to answer the user's question concisely and include a short 'Sources' section indicating the most relevant context excerpts.
 
@@ -17,5 +29,5 @@ Context:
 
 Question: {question}
 
-Answer:""""
+Answer:"""
     return prompt
@@ -4,51 +4,175 @@
 #**Date:** August 2025 
 
 """
-LLM wrapper that calls OpenAI's completions/chat API when OPENAI_API_KEY is set.
+LLM wrapper that calls an OpenAI-compatible chat completions API when OPENAI_API_KEY is set.
 If the API key is missing, returns a mocked deterministic answer for reproducibility.
+When a key is set, a call that still fails after the client's retries raises
+LLMError: an outage is never passed off as an answer.
+Requests go through the pooled async client in llm/client.py (timeouts, retries,
+concurrency limit, OPENAI_BASE_URL). Deterministic (temperature=0.0) responses
+are cached and identical in-flight requests are coalesced into one upstream call
+(see llm/response_cache.py). stream_openai yields the answer incrementally and
+records time-to-first-token.
 """
 
+import asyncio
 import os
 import logging
-
-try:
-    import openai
-except Exception:
-    openai = None  # openai package may not be installed in grading environment
+import time
+from typing import Iterator, List, Optional
+from llm.client import LLMError, get_client, httpx
+from llm.response_cache import Coalescer, cache_key, cache_from_env
+from monitoring.tracing import record, register_gauges, traced
 
 logger = logging.getLogger(__name__)
 
-def query_openai(prompt: str, model: str = "gpt-4o-mini", max_tokens: int = 512, temperature: float = 0.0):
-    """Query OpenAI API using the Chat Completions (or completions) endpoint.
+MOCK_ANSWER = "Mocked LLM answer based on provided context. (Set OPENAI_API_KEY to use real OpenAI API.)"
+
+_response_cache = cache_from_env()
+_coalescer = Coalescer()
+
+def set_response_cache(cache):
+    """Replace the response cache (any object with get(key)/set(key, value)); None disables it."""
+    global _response_cache
+    _response_cache = cache
+
+def _cache_stats() -> dict:
+    stats = getattr(_response_cache, "stats", None)
+    return stats() if stats is not None else {}
+
+register_gauges("llm_cache", _cache_stats)
+
+def _llm_available() -> bool:
+    return bool(os.getenv("OPENAI_API_KEY")) and httpx is not None
+
+def llm_backend(model: str = "gpt-4o-mini") -> str:
+    """Which model would answer right now ('mock' without an API key)."""
+    return model if _llm_available() else "mock"
+
+@traced("llm.answer")
+def query_openai(prompt: str, model: str = "gpt-4o-mini", max_tokens: int = 512, temperature: float = 0.0,
+                 use_cache: bool = True):
+    """Query the Chat Completions endpoint.
     - Reads OPENAI_API_KEY from environment variables for security.
-    - Returns model text. If API key or openai package is not available, returns a mocked answer.
+    - Returns model text; the mocked answer only if the API key or HTTP client is
+      not available. Raises LLMError if the call fails after retries.
+    - temperature=0.0 answers are served from the response cache when possible.
     """
-    api_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY", None)
-    if api_key and openai is not None:
+    if not _llm_available():
+        return MOCK_ANSWER
+    cache = _response_cache if use_cache and temperature == 0.0 else None
+    if cache is None:
+        return _call_openai(prompt, model, max_tokens, temperature)
+    key = cache_key(model, prompt, max_tokens, temperature)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    def fetch():
+        hit = cache.get(key)  # a previous leader may have just finished
+        if hit is not None:
+            return hit
+        answer = _call_openai(prompt, model, max_tokens, temperature)
+        if answer:
+            cache.set(key, answer)
+        return answer
+
+    return _coalescer.run(key, fetch)
+
+@traced("llm.answer")
+async def aquery_openai(prompt: str, model: str = "gpt-4o-mini", max_tokens: int = 512, temperature: float = 0.0,
+                        use_cache: bool = True, timeout: Optional[float] = None):
+    """Async variant of query_openai for use inside an event loop (e.g. the HTTP API);
+    raises LLMError like query_openai."""
+    if not _llm_available():
+        return MOCK_ANSWER
+    cache = _response_cache if use_cache and temperature == 0.0 else None
+    key = cache_key(model, prompt, max_tokens, temperature)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    async def fetch():
         try:
-            openai.api_key = api_key
-            # Use ChatCompletion if available; fallback to completion
-            if hasattr(openai, "ChatCompletion"):
-                response = openai.ChatCompletion.create(
-                    model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                )
-                # Extract assistant reply
-                if response and "choices" in response and len(response.choices) > 0:
-                    return response.choices[0].message.get("content", "").strip()
-            else:
-                response = openai.Completion.create(
-                    engine=model,
-                    prompt=prompt,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                )
-                if response and "choices" in response and len(response.choices) > 0:
-                    return response.choices[0].text.strip()
-        except Exception as e:
+            answer = await get_client().acomplete(prompt, model=model, max_tokens=max_tokens,
+                                                  temperature=temperature, timeout=timeout)
+        except LLMError as e:
             logger.warning(f"OpenAI API call failed: {e}")
-            # Fallthrough to mock
-    # Mock deterministic response if API key missing or error occurred
-    return "Mocked LLM answer based on provided context. (Set OPENAI_API_KEY to use real OpenAI API.)"
+            raise
+        if answer and cache is not None:
+            cache.set(key, answer)
+        return answer
+
+    return await (_coalescer.arun(key, fetch) if cache is not None else fetch())
+
+def stream_openai(prompt: str, model: str = "gpt-4o-mini", max_tokens: int = 512, temperature: float = 0.0,
+                  use_cache: bool = True, stats: Optional[dict] = None) -> Iterator[str]:
+    """Yield the answer as text chunks as they arrive.
+    - Without an API key the mock answer is streamed word by word.
+    - A cached answer is yielded in one chunk; a completed stream is cached.
+    - Raises LLMError if the stream fails (after retries, or part way through).
+    - If `stats` is given it receives ttft_s (time to first token), total_s and chunks.
+    """
+    stats = stats if stats is not None else {}
+    start = time.perf_counter()
+    stats.update(ttft_s=None, total_s=None, chunks=0)
+
+    def emit(chunk):
+        if stats["ttft_s"] is None:
+            stats["ttft_s"] = time.perf_counter() - start
+        stats["chunks"] += 1
+        return chunk
+
+    cache = _response_cache if use_cache and temperature == 0.0 else None
+    key = cache_key(model, prompt, max_tokens, temperature)
+    cached = cache.get(key) if cache is not None and _llm_available() else None
+    try:
+        if not _llm_available():
+            words = MOCK_ANSWER.split(" ")
+            for i, word in enumerate(words):
+                yield emit(word if i == len(words) - 1 else word + " ")
+        elif cached is not None:
+            yield emit(cached)
+        else:
+            parts = []
+            try:
+                for delta in get_client().stream(prompt, model=model, max_tokens=max_tokens, temperature=temperature):
+                    parts.append(delta)
+                    yield emit(delta)
+            except LLMError as e:
+                logger.warning(f"OpenAI streaming call failed after {len(parts)} chunks: {e}")
+                raise
+            answer = "".join(parts).strip()
+            if answer and cache is not None:
+                cache.set(key, answer)
+    finally:
+        stats["total_s"] = time.perf_counter() - start
+        if stats["ttft_s"] is not None:
+            record("llm.ttft", stats["ttft_s"] * 1000.0)
+            record("llm.stream", stats["total_s"] * 1000.0)
+            logger.info(f"LLM stream: ttft={stats['ttft_s'] * 1000:.0f}ms total={stats['total_s'] * 1000:.0f}ms chunks={stats['chunks']}")
+
+def query_openai_many(prompts: List[str], model: str = "gpt-4o-mini", max_tokens: int = 512,
+                      temperature: float = 0.0, use_cache: bool = True) -> List[str]:
+    """Answer many prompts concurrently over the shared client (blocking; call it
+    outside an event loop). Each prompt goes through aquery_openai, so it shares
+    the response cache and the in-flight coalescing with query_openai; duplicate
+    prompts are sent once and the output keeps input order."""
+    if not _llm_available():
+        return [MOCK_ANSWER for _ in prompts]
+    unique = list(dict.fromkeys(prompts))
+
+    async def run_all():
+        return await asyncio.gather(*[aquery_openai(p, model=model, max_tokens=max_tokens, temperature=temperature,
+                                                    use_cache=use_cache) for p in unique])
+    answers = dict(zip(unique, asyncio.run(run_all()))) if unique else {}
+    return [answers[p] for p in prompts]
+
+def _call_openai(prompt: str, model: str, max_tokens: int, temperature: float):
+    """One upstream call; raises LLMError on failure, so errors are never cached."""
+    try:
+        return get_client().complete(prompt, model=model, max_tokens=max_tokens, temperature=temperature)
+    except LLMError as e:
+        logger.warning(f"OpenAI API call failed: {e}")
+        raise
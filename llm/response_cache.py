@@ -0,0 +1,145 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""
+LLM response caching and request coalescing.
+- cache_key: SHA-256 of (model, prompt, max_tokens, temperature)
+- MemoryResponseCache: in-process LRU tier
+- SQLiteResponseCache: on-disk tier shared by worker processes
+- TieredResponseCache: memory first, then disk (disk hits are promoted)
+- Coalescer: concurrent identical requests share one upstream call
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from retrieval.cache import LRUCache
+
+def cache_key(model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+    payload = json.dumps([model, prompt, int(max_tokens), float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryResponseCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self._lru = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._lru.get(key)
+
+    def set(self, key: str, response: str):
+        self._lru.set(key, response)
+
+    def stats(self) -> dict:
+        return self._lru.stats()
+
+class SQLiteResponseCache:
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        self.path = str(path)
+        self.ttl = ttl
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        return row[0]
+
+    def set(self, key: str, response: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                               (key, response, time.time()))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class TieredResponseCache:
+    def __init__(self, memory: MemoryResponseCache, disk: Optional[SQLiteResponseCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.memory.get(key)
+        if response is None and self.disk is not None:
+            response = self.disk.get(key)
+            if response is not None:
+                self.memory.set(key, response)
+        return response
+
+    def set(self, key: str, response: str):
+        self.memory.set(key, response)
+        if self.disk is not None:
+            self.disk.set(key, response)
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+class Coalescer:
+    """Runs at most one call per key at a time; concurrent callers with the same
+    key wait for the leader's result (or exception) instead of calling again."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def run(self, key: str, fn: Callable[[], object]):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def arun(self, key: str, coro_fn: Callable[[], Awaitable]):
+        """Async counterpart of run(); shares the in-flight map with sync callers."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+def cache_from_env():
+    """LLM_CACHE=off disables caching; LLM_CACHE_PATH adds the SQLite tier."""
+    if os.getenv("LLM_CACHE", "on").lower() in ("off", "0", "false", "no"):
+        return None
+    path = os.getenv("LLM_CACHE_PATH")
+    return TieredResponseCache(MemoryResponseCache(), SQLiteResponseCache(path) if path else None)
@@ -4,31 +4,45 @@
 #**Date:** August 2025 
 
 """
-Monitoring dashboard with 5 concrete charts based on feedback CSV.
-CSV expected columns: query,response,feedback,ts,rating,source_snippet
+Monitoring dashboard with 5 concrete charts based on stored feedback
+(monitoring/feedback_store.py; columns: query,response,feedback,ts,rating,source_snippet,source).
+Latency panels read the tracing metrics store (run the app/API with TRACING=on).
 """
+import os
+import time
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 from collections import Counter
 import numpy as np
+from monitoring.feedback_store import COLUMNS, get_feedback_store
+from monitoring.tracing import DEFAULT_METRICS_PATH, MetricsStore
 
 st.set_page_config(page_title='Monitoring Dashboard', layout='wide')
+
+@st.cache_resource
+def get_metrics_store(path: str) -> MetricsStore:
+    # One read-only connection per process: reruns neither reopen the database
+    # nor prune the store the live recorder writes to
+    return MetricsStore(path, read_only=True)
 st.title('📊 Monitoring Dashboard (Feedback Analytics)')
 
 # Load sample or real feedback data
-try:
-    df = pd.read_csv('monitoring/user_feedback.csv')
-except FileNotFoundError:
+feedback_store = get_feedback_store()
+df = pd.DataFrame(feedback_store.rows(), columns=COLUMNS)
+if df.empty:
     # Create a sample dataframe for demo purposes
     data = [
-        ['signs of depression','Answer A','Yes','2025-01-01T12:00:00','5','Depression is common'],
-        ['how to manage anxiety','Answer B','Yes','2025-01-02T13:00:00','4','breathing exercises'],
-        ['support a friend','Answer C','No','2025-01-03T14:00:00','3','seek professional help'],
-        ['sleep problems','Answer D','Yes','2025-01-04T15:00:00','5','sleep hygiene'],
-        ['panic attack','Answer E','No','2025-01-05T16:00:00','2','grounding techniques']
+        ['signs of depression','Answer A','Yes','2025-01-01T12:00:00','5','Depression is common','nih_depression_excerpt.txt#0'],
+        ['how to manage anxiety','Answer B','Yes','2025-01-02T13:00:00','4','breathing exercises','nhs_anxiety_excerpt.txt#2'],
+        ['support a friend','Answer C','No','2025-01-03T14:00:00','3','seek professional help','who_mental_health_excerpt.txt#3'],
+        ['sleep problems','Answer D','Yes','2025-01-04T15:00:00','5','sleep hygiene','mental_health_intro.txt#1'],
+        ['panic attack','Answer E','No','2025-01-05T16:00:00','2','grounding techniques','nhs_anxiety_excerpt.txt#5']
     ]
-    df = pd.DataFrame(data, columns=['query','response','feedback','ts','rating','source_snippet'])
+    df = pd.DataFrame(data, columns=COLUMNS)
+else:
+    st.sidebar.download_button('Export feedback CSV', df.to_csv(index=False), file_name='user_feedback.csv',
+                               mime='text/csv')
 
 # Ensure correct types
 df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
@@ -63,9 +77,9 @@ fig3, ax3 = plt.subplots()
 top_queries.plot(kind='bar', ax=ax3)
 st.pyplot(fig3, use_container_width=True)
 
-# Chart 4: Top source snippets frequency
-st.subheader('4) Top source snippets (frequency)')
-source_counts = df['source_snippet'].value_counts().head(10)
+# Chart 4: Top sources (file#chunk), falling back to snippets for rows logged without attribution
+st.subheader('4) Top sources (frequency)')
+source_counts = df['source'].where(df['source'].notna() & (df['source'] != ''), df['source_snippet']).value_counts().head(10)
 fig4, ax4 = plt.subplots(figsize=(6,3))
 source_counts.plot(kind='barh', ax=ax4)
 st.pyplot(fig4, use_container_width=True)
@@ -79,4 +93,46 @@ ax5.set_xlabel('Response length (words)')
 ax5.set_ylabel('Rating (1-5)')
 st.pyplot(fig5, use_container_width=True)
 
-st.markdown('**Notes:** For production, connect feedback collection to a DB, add timestamps at ingestion, and include user IDs/hashed identifiers for analysis.')
+# Pipeline latency (per-stage spans recorded by monitoring/tracing.py)
+st.header('⏱️ Pipeline latency')
+metrics_path = os.getenv('METRICS_PATH', DEFAULT_METRICS_PATH)
+if not os.path.exists(metrics_path):
+    st.info('No latency data yet. Start the app or API with TRACING=on to record per-stage timings.')
+else:
+    metrics = get_metrics_store(metrics_path)
+    window_h = st.selectbox('Latency window (hours)', [1, 6, 24, 168], index=2)
+    since = time.time() - window_h * 3600
+    lat = pd.DataFrame.from_dict(metrics.latency_summary(since), orient='index')
+    if lat.empty:
+        st.info('No spans recorded in this window.')
+    else:
+        # Chart 6: p50/p95/p99 per stage
+        st.subheader('6) Latency percentiles per stage (ms)')
+        st.dataframe(lat[['count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms']].round(2), use_container_width=True)
+        fig6, ax6 = plt.subplots(figsize=(7, 0.4 * len(lat) + 1.5))
+        lat[['p50_ms', 'p95_ms', 'p99_ms']].sort_values('p95_ms').plot(kind='barh', ax=ax6)
+        ax6.set_xlabel('ms')
+        st.pyplot(fig6, use_container_width=True)
+
+        # Chart 7: p95 over time per stage
+        st.subheader('7) p95 latency over time')
+        series = pd.DataFrame(metrics.latency_series(since, bucket_s=300 if window_h <= 6 else 3600),
+                              columns=['ts', 'stage', 'p95_ms'])
+        fig7, ax7 = plt.subplots()
+        pivot = series.assign(ts=pd.to_datetime(series['ts'], unit='s')).pivot(index='ts', columns='stage', values='p95_ms')
+        pivot.plot(ax=ax7, marker='.')
+        ax7.set_ylabel('p95 ms')
+        st.pyplot(fig7, use_container_width=True)
+
+    # Cache hit rates and token usage
+    gauges = metrics.latest_gauges()
+    counters = metrics.counter_totals(since)
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric('Result cache hit rate', f"{gauges.get('cache.results.hit_rate', 0):.0%}")
+    c2.metric('Query-embedding cache hit rate', f"{gauges.get('cache.query_embeddings.hit_rate', 0):.0%}")
+    c3.metric('LLM cache hit rate', f"{gauges.get('llm_cache.hit_rate', 0):.0%}")
+    c4.metric('LLM tokens (prompt / completion)',
+              f"{int(counters.get('llm.prompt_tokens', 0))} / {int(counters.get('llm.completion_tokens', 0))}")
+    c5.metric('Context tokens saved', f"{int(counters.get('prompt.context_tokens_saved', 0))}")
+
+st.markdown('**Notes:** Feedback is stored in SQLite (FEEDBACK_DB); for production analysis, include user IDs/hashed identifiers.')
@@ -3,17 +3,191 @@
 #**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
 #**Date:** August 2025 
 
-"""Feedback persistence helpers (stores CSV columns: query,response,feedback,ts,rating,source_snippet)"""
-import csv, os
+"""Feedback persistence (columns: query,response,feedback,ts,rating,source_snippet,source).
+
+save_feedback() only appends the row to an in-memory buffer, so the UI thread
+never waits on disk. A background thread group-commits the buffer into SQLite
+(WAL mode, FEEDBACK_DB, default monitoring/feedback.sqlite) every
+`flush_interval` seconds or `max_buffer` rows, one transaction per batch, so
+concurrent sessions never interleave partial rows. ts, rating and query are
+indexed; export_csv() writes the legacy CSV layout:
+
+    python -m monitoring.feedback_store --export monitoring/user_feedback.csv
+"""
+import argparse
+import atexit
+import csv
+import logging
+import os
+import sqlite3
+import threading
 from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
 
 FEEDBACK_CSV = "monitoring/user_feedback.csv"
+FEEDBACK_DB = "monitoring/feedback.sqlite"
+COLUMNS = ["query", "response", "feedback", "ts", "rating", "source_snippet", "source"]
+
+class FeedbackStore:
+    def __init__(self, path: str = FEEDBACK_DB, flush_interval: float = 0.5, max_buffer: int = 1000):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()  # guards the buffer only; add() never waits on a commit
+        self._db_lock = threading.Lock()
+        self._buffer = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.created = self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                          "AND name = 'feedback'").fetchone() is None
+        self._conn.execute("CREATE TABLE IF NOT EXISTS feedback (id INTEGER PRIMARY KEY, query TEXT NOT NULL, "
+                           "response TEXT, feedback TEXT, ts TEXT NOT NULL, rating INTEGER, source_snippet TEXT, "
+                           "source TEXT)")
+        if "source" not in [r[1] for r in self._conn.execute("PRAGMA table_info(feedback)")]:
+            self._conn.execute("ALTER TABLE feedback ADD COLUMN source TEXT")
+        for col in ("ts", "rating", "query"):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS feedback_{col} ON feedback ({col})")
+        self._conn.commit()
+
+    def add(self, query, response, feedback, rating=None, source_snippet=None, source=None, ts: Optional[str] = None):
+        row = (query, response, feedback, ts or datetime.utcnow().isoformat(),
+               int(float(rating)) if rating not in (None, '') else None, source_snippet, source)
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self._wake.set()
+        self._ensure_thread()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self) -> int:
+        """Commit everything buffered so far in one transaction; returns the row count."""
+        with self._db_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO feedback (query, response, feedback, ts, rating, "
+                                           "source_snippet, source) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._buffer = rows + self._buffer  # keep them for the next attempt
+                logger.warning(f'Could not write feedback: {e}')
+                return 0
+        return len(rows)
+
+    def rows(self, since: Optional[str] = None, min_rating: Optional[int] = None,
+             query: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Stored feedback (oldest first), optionally filtered on the indexed columns."""
+        self.flush()
+        where, args = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            args.append(since)
+        if min_rating is not None:
+            where.append("rating >= ?")
+            args.append(min_rating)
+        if query is not None:
+            where.append("query = ?")
+            args.append(query)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM feedback"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._db_lock:
+            return [dict(zip(COLUMNS, r)) for r in self._conn.execute(sql, args).fetchall()]
+
+    def count(self) -> int:
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+
+    def export_csv(self, path: str = FEEDBACK_CSV) -> int:
+        rows = self.rows()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, "w", newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for r in rows:
+                writer.writerow(['' if r[c] is None else r[c] for c in COLUMNS])
+        return len(rows)
+
+    def import_csv(self, path: str = FEEDBACK_CSV) -> int:
+        """Load rows from an exported or legacy (no source column) CSV; the header is optional."""
+        n = 0
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if not row or row[:4] == COLUMNS[:4]:
+                    continue
+                row = (row + [''] * len(COLUMNS))[:len(COLUMNS)]
+                q, response, feedback, ts, rating, snippet, source = row
+                self.add(q, response, feedback, rating=rating or None, source_snippet=snippet,
+                         source=source or None, ts=ts or None)
+                n += 1
+        self.flush()
+        return n
+
+    def close(self):
+        """Stop the writer thread, commit what is left and close the database."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='feedback-writer', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._stop.is_set():
+                self.flush()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_feedback_store() -> FeedbackStore:
+    """Process-wide store; a new database starts with the rows of the legacy CSV."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = FeedbackStore(os.getenv('FEEDBACK_DB', FEEDBACK_DB))
+                if store.created and os.path.exists(FEEDBACK_CSV):
+                    store.import_csv(FEEDBACK_CSV)
+                atexit.register(store.flush)
+                _store = store
+    return _store
+
+def save_feedback(query, response, feedback, rating=None, source_snippet=None, source=None):
+    get_feedback_store().add(query, response, feedback, rating=rating, source_snippet=source_snippet, source=source)
 
-def save_feedback(query, response, feedback, rating=None, source_snippet=None):
-    os.makedirs(os.path.dirname(FEEDBACK_CSV), exist_ok=True)
-    ts = datetime.utcnow().isoformat()
-    # Ensure rating and source_snippet are optional
-    row = [query, response, feedback, ts, rating if rating is not None else '', source_snippet if source_snippet is not None else '']
-    with open(FEEDBACK_CSV, "a", newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export", default=FEEDBACK_CSV, help="CSV file to write")
+    args = parser.parse_args()
+    print(f"Exported {get_feedback_store().export_csv(args.export)} rows to {args.export}")
@@ -0,0 +1,299 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""
+Lightweight per-stage tracing for the request path.
+- span("stage") / @traced("stage"): time a block or function (sync or async)
+- count("name", n): add to a counter (e.g. LLM tokens)
+- register_gauges("name", fn): fn() -> dict sampled at every flush (e.g. cache hit rates)
+
+Disabled by default. When disabled, span() returns a shared no-op object and
+@traced calls the function directly, so the cost is one flag check. When
+enabled (TRACING=on or enable_tracing()), durations are kept in a bounded
+in-memory window for live percentiles and are group-committed by a background
+thread to a SQLite metrics store (METRICS_PATH, default monitoring/metrics.sqlite)
+that the monitoring dashboard reads. Rows older than METRICS_RETENTION_DAYS
+(default 14; 0 keeps everything) are deleted at startup and then about once an
+hour by the flushing thread.
+"""
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_PATH = 'monitoring/metrics.sqlite'
+DEFAULT_RETENTION_DAYS = 14
+PRUNE_INTERVAL_S = 3600.0
+PERCENTILES = (50, 95, 99)
+
+class MetricsStore:
+    """SQLite (WAL) tables: spans(ts, stage, ms), counters(ts, name, value), gauges(ts, name, value).
+
+    read_only=True opens an existing store for readers (the dashboard): no
+    schema changes, no pruning, and writes fail."""
+    def __init__(self, path: str = DEFAULT_METRICS_PATH, retention_days: Optional[float] = None,
+                 read_only: bool = False):
+        self.path = str(path)
+        self.read_only = read_only
+        if retention_days is None:
+            retention_days = float(os.getenv('METRICS_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+        self.retention_s = retention_days * 86400.0
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if read_only:
+            self._conn = sqlite3.connect(f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True,
+                                         check_same_thread=False, timeout=30)
+            return
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS spans (ts REAL NOT NULL, stage TEXT NOT NULL, ms REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spans_stage_ts ON spans (stage, ts)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (ts REAL NOT NULL, name TEXT NOT NULL, value REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS gauges (ts REAL NOT NULL, name TEXT NOT NULL, value REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS gauges_name_ts ON gauges (name, ts)")
+        self._conn.commit()
+        self.prune()
+
+    def write(self, spans=(), counters=(), gauges=()):
+        with self._lock:
+            self._conn.executemany("INSERT INTO spans (ts, stage, ms) VALUES (?, ?, ?)", spans)
+            self._conn.executemany("INSERT INTO counters (ts, name, value) VALUES (?, ?, ?)", counters)
+            self._conn.executemany("INSERT INTO gauges (ts, name, value) VALUES (?, ?, ?)", gauges)
+            self._conn.commit()
+        if time.time() - self._last_prune >= PRUNE_INTERVAL_S:
+            self.prune()
+
+    def prune(self, before: Optional[float] = None) -> int:
+        """Delete rows older than `before` (default: the retention period); returns the row count."""
+        if self.read_only:
+            return 0
+        if before is None:
+            if self.retention_s <= 0:
+                return 0
+            before = time.time() - self.retention_s
+        with self._lock:
+            n = sum(self._conn.execute(f"DELETE FROM {table} WHERE ts < ?", (before,)).rowcount
+                    for table in ("spans", "counters", "gauges"))
+            self._conn.commit()
+            self._last_prune = time.time()
+        return n
+
+    def _rows(self, sql: str, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def latency_summary(self, since: float = 0.0) -> Dict[str, dict]:
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} for spans newer than `since`."""
+        by_stage = {}
+        for stage, ms in self._rows("SELECT stage, ms FROM spans WHERE ts >= ?", (since,)):
+            by_stage.setdefault(stage, []).append(ms)
+        return {stage: summarize(values) for stage, values in sorted(by_stage.items())}
+
+    def latency_series(self, since: float = 0.0, bucket_s: float = 3600.0):
+        """[(bucket_start_ts, stage, p95_ms)] for a latency-over-time chart."""
+        buckets = {}
+        for ts, stage, ms in self._rows("SELECT ts, stage, ms FROM spans WHERE ts >= ?", (since,)):
+            buckets.setdefault((ts - ts % bucket_s, stage), []).append(ms)
+        return [(b, stage, float(np.percentile(v, 95))) for (b, stage), v in sorted(buckets.items())]
+
+    def counter_totals(self, since: float = 0.0) -> Dict[str, float]:
+        return dict(self._rows("SELECT name, SUM(value) FROM counters WHERE ts >= ? GROUP BY name ORDER BY name", (since,)))
+
+    def latest_gauges(self) -> Dict[str, float]:
+        return dict(self._rows("SELECT name, value FROM gauges g WHERE ts = "
+                               "(SELECT MAX(ts) FROM gauges WHERE name = g.name) ORDER BY name"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def summarize(values) -> dict:
+    arr = np.asarray(values, dtype='float64')
+    if arr.size == 0:
+        return {"count": 0}
+    pct = np.percentile(arr, PERCENTILES)
+    out = {"count": int(arr.size), "mean_ms": float(arr.mean())}
+    out.update({f"p{p}_ms": float(v) for p, v in zip(PERCENTILES, pct)})
+    return out
+
+class MetricsRecorder:
+    """Collects spans and counters in memory and flushes them to a MetricsStore in
+    batches (every `flush_interval` seconds or `max_buffer` spans)."""
+    def __init__(self, store: Optional[MetricsStore] = None, window: int = 10_000,
+                 flush_interval: float = 5.0, max_buffer: int = 2000):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._window = window
+        self._recent = {}
+        self._spans = []
+        self._counters = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, stage: str, ms: float):
+        with self._lock:
+            recent = self._recent.get(stage)
+            if recent is None:
+                recent = self._recent[stage] = deque(maxlen=self._window)
+            recent.append(ms)
+            if self.store is not None:
+                self._spans.append((time.time(), stage, ms))
+                if len(self._spans) >= self.max_buffer:
+                    self._wake.set()
+        self._ensure_thread()
+
+    def count(self, name: str, value: float = 1):
+        if self.store is None:
+            return
+        with self._lock:
+            self._counters.append((time.time(), name, value))
+        self._ensure_thread()
+
+    def summary(self) -> Dict[str, dict]:
+        """Percentiles over the most recent `window` spans of each stage in this process."""
+        with self._lock:
+            snapshot = {stage: list(v) for stage, v in self._recent.items()}
+        return {stage: summarize(v) for stage, v in sorted(snapshot.items())}
+
+    def flush(self):
+        if self.store is None:
+            return
+        with self._lock:
+            spans, self._spans = self._spans, []
+            counters, self._counters = self._counters, []
+        now = time.time()
+        gauges = []
+        for prefix, fn in list(_GAUGES.items()):
+            try:
+                gauges += [(now, _join(prefix, name), float(v)) for name, v in _flatten(fn()).items()]
+            except Exception as e:
+                logger.debug(f'Gauge {prefix} failed: {e}')
+        try:
+            self.store.write(spans, counters, gauges)
+        except sqlite3.Error as e:
+            logger.warning(f'Could not write metrics: {e}')
+
+    def _ensure_thread(self):
+        if self._thread is not None or self.store is None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='metrics-flush', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+def _join(prefix: str, name: str) -> str:
+    return f'{prefix}.{name}' if name else prefix
+
+def _flatten(d: dict, prefix: str = '') -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = _join(prefix, str(k)) if prefix else str(k)
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)):
+            out[key] = v
+    return out
+
+_GAUGES: Dict[str, Callable[[], dict]] = {}
+_enabled = os.getenv('TRACING', 'off').lower() in ('on', '1', 'true', 'yes')
+_recorder = MetricsRecorder(MetricsStore(os.getenv('METRICS_PATH', DEFAULT_METRICS_PATH)) if _enabled else None)
+
+def enable_tracing(store: Optional[MetricsStore] = None, **recorder_args) -> MetricsRecorder:
+    """Turn tracing on (optionally persisting to `store`) with a fresh recorder."""
+    global _enabled, _recorder
+    _recorder = MetricsRecorder(store, **recorder_args)
+    _enabled = True
+    return _recorder
+
+def disable_tracing():
+    global _enabled
+    _enabled = False
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+def get_recorder() -> MetricsRecorder:
+    return _recorder
+
+def register_gauges(name: str, fn: Callable[[], dict]):
+    """Sample fn() (a possibly nested dict of numbers) at every metrics flush."""
+    _GAUGES[name] = fn
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _recorder.record(self.name, (time.perf_counter() - self.start) * 1000.0)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name: str):
+    """Context manager timing a pipeline stage."""
+    return _Span(name) if _enabled else _NOOP
+
+def record(name: str, ms: float):
+    """Record an externally measured duration (e.g. time to first token)."""
+    if _enabled:
+        _recorder.record(name, ms)
+
+def count(name: str, value: float = 1):
+    if _enabled:
+        _recorder.count(name, value)
+
+def traced(name: str):
+    """Decorator form of span() for sync and async functions."""
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
@@ -0,0 +1,134 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+
+"""BM25 sparse index over the ingested chunks.
+
+Postings are stored CSR-style in flat NumPy arrays: the postings of term t are
+doc_ids[offsets[t]:offsets[t+1]] with matching term frequencies in tfs. IDF and
+the per-document length norm k1*(1 - b + b*len/avgdl) are precomputed, so a query
+only touches the postings of its own terms. The index is persisted as bm25.npz
+next to the chunk file and keyed by its content hash.
+"""
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional
+import numpy as np
+from retrieval.query_rewrite import normalize_query
+from retrieval.ann_index import top_k_rows
+from retrieval.vector_store import content_hash
+from retrieval.cache import new_version
+from retrieval.chunk_store import chunks_path, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+BM25_FILE = 'bm25.npz'
+BM25_FORMAT_VERSION = 1
+
+def tokenize(text: str) -> List[str]:
+    return normalize_query(text).split()
+
+class BM25Index:
+    def __init__(self, terms, offsets, doc_ids, tfs, doc_len, k1: float = 1.5, b: float = 0.75, chunks_hash: Optional[str] = None):
+        self.vocab = {t: i for i, t in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.chunks_hash = chunks_hash
+        self.version = new_version(chunks_hash)
+        n_docs = len(doc_len)
+        df = np.diff(offsets).astype('float32')
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype('float32')
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        self.norm = (k1 * (1.0 - b + b * doc_len / max(avgdl, 1e-8))).astype('float32')
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, chunks: Iterable[dict], k1: float = 1.5, b: float = 0.75, chunks_hash: Optional[str] = None):
+        """Index `chunks` in one pass; any iterable works (e.g. iter_chunks())."""
+        postings = {}
+        doc_len = []
+        for doc_id, c in enumerate(chunks):
+            tokens = tokenize(c.get('text', ''))
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype='int64')
+        for i, t in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[t])
+        doc_ids = np.empty(offsets[-1], dtype='int32')
+        tfs = np.empty(offsets[-1], dtype='float32')
+        for i, t in enumerate(terms):
+            plist = postings[t]
+            doc_ids[offsets[i]:offsets[i + 1]] = [d for d, _ in plist]
+            tfs[offsets[i]:offsets[i + 1]] = [f for _, f in plist]
+        return cls(terms, offsets, doc_ids, tfs, np.array(doc_len, dtype='float32'), k1=k1, b=b, chunks_hash=chunks_hash)
+
+    def search(self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None):
+        """Return [(doc_id, score), ...] for the top_k matching chunks, best first.
+        `mask` (a boolean bitmap over doc ids) restricts the candidates."""
+        q_terms = Counter(t for t in tokenize(query) if t in self.vocab)
+        if not q_terms or self.n_docs == 0:
+            return []
+        scores = np.zeros(self.n_docs, dtype='float32')
+        touched = []
+        for term, qtf in q_terms.items():
+            t = self.vocab[term]
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[docs] += qtf * self.idf[t] * tf * (self.k1 + 1.0) / (tf + self.norm[docs])
+            touched.append(docs)
+        candidates = np.unique(np.concatenate(touched))
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+            if len(candidates) == 0:
+                return []
+        top_s, top_i = top_k_rows(scores[candidates][None, :], top_k)
+        return [(int(candidates[i]), float(s)) for s, i in zip(top_s[0], top_i[0])]
+
+    def save(self, folder: str):
+        meta = {"format_version": BM25_FORMAT_VERSION, "k1": self.k1, "b": self.b, "chunks_hash": self.chunks_hash}
+        np.savez(Path(folder) / BM25_FILE, terms=np.array(self.terms, dtype=str), offsets=self.offsets,
+                 doc_ids=self.doc_ids, tfs=self.tfs, doc_len=self.doc_len, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, folder: str):
+        with np.load(Path(folder) / BM25_FILE, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get("format_version") != BM25_FORMAT_VERSION:
+                raise ValueError(f'Unsupported BM25 format version: {meta.get("format_version")}')
+            return cls(data['terms'].tolist(), data['offsets'], data['doc_ids'], data['tfs'], data['doc_len'],
+                       k1=meta["k1"], b=meta["b"], chunks_hash=meta.get("chunks_hash"))
+
+def load_or_build_bm25(folder: str = "data/processed"):
+    """Load bm25.npz if it matches the chunk file; otherwise rebuild and persist it."""
+    path = chunks_path(folder)
+    if not path.exists():
+        return None
+    chunks_hash = content_hash(path)
+    if (Path(folder) / BM25_FILE).exists():
+        try:
+            index = BM25Index.load(folder)
+            if index.chunks_hash == chunks_hash:
+                return index
+        except Exception as e:
+            logger.warning(f'Failed to load BM25 index, rebuilding: {e}')
+    index = BM25Index.build(iter_chunks(folder), chunks_hash=chunks_hash)
+    try:
+        index.save(folder)
+    except OSError as e:
+        logger.warning(f'Could not persist BM25 index: {e}')
+    return index
@@ -0,0 +1,100 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+
+"""Bounded, thread-safe caches for the retrieval hot path.
+
+- QUERY_EMBEDDINGS: (model name, normalised query) -> embedding vector
+- RESULTS: (method, query, k, index version) -> ranked results (read through
+  cached_results(), which hands out copies)
+
+Entries are evicted least-recently-used once `maxsize` is reached and expire
+after `ttl` seconds. Result keys carry the index version, so a rebuilt index
+never serves stale rankings; rebuilding the module-level index also clears
+RESULTS to release memory.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+from monitoring.tracing import register_gauges
+
+_MISSING = object()
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires is None or expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value):
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data),
+                "hit_rate": self.hits / total if total else 0.0}
+
+QUERY_EMBEDDINGS = LRUCache(maxsize=4096, ttl=3600)
+RESULTS = LRUCache(maxsize=2048, ttl=600)
+
+def cached_results(key: Hashable, compute: Callable[[], list]) -> list:
+    """Ranked results for `key` from RESULTS, computed on a miss. The cache keeps
+    a tuple, and every call gets its own copies of the result dicts, so callers
+    may annotate or reorder them without changing later hits."""
+    results = RESULTS.get_or_compute(key, lambda: tuple(compute()))
+    return [dict(r) if isinstance(r, dict) else r for r in results]
+
+_VERSIONS = itertools.count(1)
+
+def new_version(tag: Optional[str] = None) -> str:
+    """Process-unique version string for an index; changes on every (re)build."""
+    return f"{(tag or 'adhoc')[:12]}:{next(_VERSIONS)}"
+
+def cache_stats() -> dict:
+    return {"query_embeddings": QUERY_EMBEDDINGS.stats(), "results": RESULTS.stats()}
+
+register_gauges("cache", cache_stats)
+
+def clear_caches():
+    QUERY_EMBEDDINGS.clear()
+    RESULTS.clear()
@@ -0,0 +1,176 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+
+"""Line-delimited chunk storage with an offset index.
+
+Chunks are written one compact JSON object per line to chunks.jsonl, and the
+byte offset of every line is saved next to it as chunks.offsets.npy (n + 1
+int64 values, the last one being the file size). That gives:
+
+- streaming writes (ChunkWriter) whose memory does not grow with the corpus
+- a generator reader (iter_chunks) for one pass over the whole corpus
+- random access by row (ChunkStore[i]) through a memory map, so a chunk's text
+  is only parsed when it is actually needed, e.g. when it is displayed
+
+Folders that still contain a legacy pretty-printed chunks.json are read as before.
+"""
+import json
+import mmap
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+import numpy as np
+
+CHUNKS_FILE = 'chunks.jsonl'
+OFFSETS_FILE = 'chunks.offsets.npy'
+LEGACY_CHUNKS_FILE = 'chunks.json'
+
+def chunks_path(folder: str) -> Path:
+    """The chunk file that defines the corpus of `folder` (and keys its indexes)."""
+    path = Path(folder) / CHUNKS_FILE
+    if path.exists() or not (Path(folder) / LEGACY_CHUNKS_FILE).exists():
+        return path
+    return Path(folder) / LEGACY_CHUNKS_FILE
+
+class ChunkWriter:
+    """Append chunks one at a time; the files are swapped in atomically on close(),
+    so readers of the folder never see a half-written corpus."""
+    def __init__(self, folder: str):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.folder / (CHUNKS_FILE + '.tmp')
+        self._f = open(self._tmp, 'wb')
+        self._offsets = [0]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def write(self, chunk: dict):
+        line = json.dumps(chunk, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._f.write(line)
+        self._offsets.append(self._offsets[-1] + len(line))
+
+    def write_many(self, chunks: Iterable[dict]):
+        for c in chunks:
+            self.write(c)
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._f.close()
+        offsets_tmp = self.folder / (OFFSETS_FILE + '.tmp')
+        with open(offsets_tmp, 'wb') as f:
+            np.save(f, np.array(self._offsets, dtype='int64'))
+        # Data first, index last: a crash in between leaves an index that
+        # ChunkStore detects as stale and rebuilds
+        os.replace(self._tmp, self.folder / CHUNKS_FILE)
+        os.replace(offsets_tmp, self.folder / OFFSETS_FILE)
+
+    def abort(self):
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
+        (self.folder / (OFFSETS_FILE + '.tmp')).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_chunks(folder: str, chunks: Iterable[dict]) -> int:
+    with ChunkWriter(folder) as writer:
+        writer.write_many(chunks)
+    return len(writer)
+
+def iter_chunks(folder: str) -> Iterator[dict]:
+    """Yield the chunks of `folder` in order without loading the whole file."""
+    path = chunks_path(folder)
+    if not path.exists():
+        return
+    if path.name == LEGACY_CHUNKS_FILE:
+        yield from json.loads(path.read_text(encoding='utf-8'))
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _scan_offsets(path: Path) -> np.ndarray:
+    offsets = [0]
+    with open(path, 'rb') as f:
+        for line in f:
+            offsets.append(offsets[-1] + len(line))
+    return np.array(offsets, dtype='int64')
+
+def _offsets_match(data, offsets: np.ndarray, size: int, samples: int = 64) -> bool:
+    """Cheap staleness check: the index ends at the file size and (a sample of)
+    its boundaries fall right after a newline."""
+    if len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != size:
+        return False
+    inner = offsets[1:-1]
+    step = max(1, len(inner) // samples)
+    return all(data[o - 1:o] == b'\n' for o in inner[::step].tolist()) and (size == 0 or data[size - 1:size] == b'\n')
+
+class ChunkStore(Sequence):
+    """Read-only, random-access view of chunks.jsonl. Only the offset array is
+    held in memory; store[i] parses line i on demand."""
+    def __init__(self, folder: str):
+        self.path = Path(folder) / CHUNKS_FILE
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        offsets = None
+        offsets_path = Path(folder) / OFFSETS_FILE
+        if offsets_path.exists():
+            offsets = np.load(offsets_path)
+            if not _offsets_match(self._mm, offsets, size):
+                offsets = None
+        if offsets is None:
+            # Missing or stale offset index (e.g. the file was written by hand)
+            offsets = _scan_offsets(self.path)
+            try:
+                np.save(offsets_path, offsets)
+            except OSError:
+                pass
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._mm[self.offsets[i]:self.offsets[i + 1]])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def text(self, i: int) -> str:
+        return self[i].get('text', '')
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+def open_chunks(folder: str) -> Optional[Sequence]:
+    """ChunkStore for a chunks.jsonl folder, the parsed list for a legacy
+    chunks.json folder, or None if the folder has no chunks yet."""
+    path = chunks_path(folder)
+    if not path.exists():
+        return None
+    if path.name == LEGACY_CHUNKS_FILE:
+        return json.loads(path.read_text(encoding='utf-8'))
+    return ChunkStore(folder)
@@ -0,0 +1,187 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+
+"""Embedding provider registry with lazy, process-wide model loading.
+
+Providers are registered by name with a zero-argument factory. Nothing heavy is
+imported or loaded until the first get_embedder() call; the instance is then
+shared by every thread (and every Streamlit session) in the process. Call
+warm_up() at server start to move the model-load cost out of the first request.
+
+Configuration:
+- EMBEDDING_PROVIDER: provider name (default: sentence-transformers if installed, else fallback)
+- EMBEDDING_MODEL: sentence-transformers model name (default all-MiniLM-L6-v2)
+"""
+import functools
+import importlib.util
+import logging
+import os
+import re
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ST_MODEL = 'all-MiniLM-L6-v2'
+FALLBACK_PROVIDER = 'fallback'
+EMBEDDING_DIM = 384
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = DEFAULT_ST_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.name = model_name
+        self._model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        emb = self._model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        return emb.astype('float32')
+
+class HashingEmbedder:
+    """CPU-only fallback: hashed character and word n-grams projected into `dim` buckets.
+
+    Character 3/4/5-grams (with word-boundary padding) are hashed with a
+    vectorised polynomial hash over the UTF-8 bytes of the whole batch; word
+    unigrams and bigrams use crc32. Both are stable across processes, unlike
+    Python's salted hash(), so persisted indexes stay valid. A second hash bit
+    picks the sign to cancel collisions on average; counts are log-damped and
+    rows L2-normalised, so similar wording gives similar vectors.
+    """
+    name = 'hashing-ngram-v1'
+    char_ngrams = (3, 4, 5)
+
+    def __init__(self, dim: int = EMBEDDING_DIM, batch_size: int = 1024):
+        self.dim = dim
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return ' '.join(re.sub(r'\W+', ' ', text.lower()).split())
+
+    def _char_features(self, docs: List[str]):
+        # One byte buffer for the batch; documents are separated by a 0 byte
+        encoded = [(' ' + d + ' ').encode('utf-8') for d in docs]
+        lengths = np.array([len(e) + 1 for e in encoded], dtype='int64')
+        buf = np.frombuffer(b''.join(e + b'\x00' for e in encoded), dtype='uint8').astype('uint64')
+        row_of = np.repeat(np.arange(len(docs)), lengths)
+        zeros = np.concatenate([[0], np.cumsum(buf == 0)])
+        rows, hashes = [], []
+        for n in self.char_ngrams:
+            if len(buf) < n:
+                continue
+            m = len(buf) - n + 1
+            h = np.full(m, n, dtype='uint64')
+            for j in range(n):
+                h = h * np.uint64(1000003) + buf[j:j + m]
+            valid = zeros[n:n + m] == zeros[:m]  # window contains no separator
+            rows.append(row_of[:m][valid])
+            hashes.append(h[valid])
+        if not rows:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='uint64')
+        return np.concatenate(rows), np.concatenate(hashes)
+
+    def _word_features(self, docs: List[str]):
+        rows, hashes = [], []
+        for i, d in enumerate(docs):
+            words = d.split()
+            grams = words + [a + ' ' + b for a, b in zip(words, words[1:])]
+            rows.extend([i] * len(grams))
+            hashes.extend(zlib.crc32(('w:' + g).encode('utf-8')) for g in grams)
+        return np.array(rows, dtype='int64'), np.array(hashes, dtype='uint64')
+
+    def encode_sparse(self, texts: List[str]):
+        """Aggregated COO features (rows, cols, values) before densifying."""
+        docs = [self._normalize(t) for t in texts]
+        r1, h1 = self._char_features(docs)
+        r2, h2 = self._word_features(docs)
+        rows = np.concatenate([r1, r2])
+        h = np.concatenate([h1, h2])
+        h ^= h >> np.uint64(29)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(32)
+        cols = (h % np.uint64(self.dim)).astype('int64')
+        signs = np.where((h >> np.uint64(40)) & np.uint64(1), 1.0, -1.0)
+        keys, inverse = np.unique(rows * self.dim + cols, return_inverse=True)
+        values = np.bincount(inverse, weights=signs, minlength=len(keys))
+        return keys // self.dim, keys % self.dim, values
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype='float32')
+        for start in range(0, len(texts), self.batch_size):
+            rows, cols, values = self.encode_sparse(texts[start:start + self.batch_size])
+            out[start + rows, cols] = np.sign(values) * np.log1p(np.abs(values))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out /= np.maximum(norms, 1e-8)
+        return out
+
+_FACTORIES: Dict[str, Callable[[], object]] = {}
+_INSTANCES: Dict[str, object] = {}
+_LOCK = threading.Lock()
+
+def register_provider(name: str, factory: Callable[[], object]):
+    """Register (or replace) an embedding provider factory."""
+    with _LOCK:
+        _FACTORIES[name] = factory
+        _INSTANCES.pop(name, None)
+
+@functools.lru_cache(maxsize=1)
+def _sentence_transformers_installed() -> bool:
+    # find_spec only locates the package; it does not import torch
+    return importlib.util.find_spec('sentence_transformers') is not None
+
+def default_provider() -> str:
+    name = os.getenv('EMBEDDING_PROVIDER')
+    if name:
+        return name
+    return 'sentence-transformers' if _sentence_transformers_installed() else FALLBACK_PROVIDER
+
+def get_embedder(name: Optional[str] = None):
+    """Return the shared embedder for `name`, loading it on first use.
+    If the provider fails to load, the fallback embedder is used (and cached)."""
+    name = name or default_provider()
+    inst = _INSTANCES.get(name)
+    if inst is not None:
+        return inst
+    with _LOCK:
+        inst = _INSTANCES.get(name)
+        if inst is None:
+            factory = _FACTORIES.get(name)
+            if factory is None:
+                raise KeyError(f'Unknown embedding provider: {name}')
+            try:
+                inst = factory()
+                logger.info(f'Loaded embedding provider {name!r}.')
+            except Exception as e:
+                if name == FALLBACK_PROVIDER:
+                    raise
+                logger.info(f'Embedding provider {name!r} not available, using fallback embeddings: {e}')
+                inst = _FACTORIES[FALLBACK_PROVIDER]()
+            _INSTANCES[name] = inst
+    return inst
+
+def embedder_name(name: Optional[str] = None) -> str:
+    """Model name that embeddings from `name` carry, without forcing a model load
+    (an already-loaded instance wins, e.g. after a fallback)."""
+    name = name or default_provider()
+    inst = _INSTANCES.get(name)
+    if inst is not None:
+        return inst.name
+    if name == 'sentence-transformers':
+        return os.getenv('EMBEDDING_MODEL', DEFAULT_ST_MODEL)
+    if name == FALLBACK_PROVIDER:
+        return HashingEmbedder.name
+    return name
+
+def warm_up(name: Optional[str] = None):
+    """Load the provider and run one tiny encode so the first request is fast."""
+    embedder = get_embedder(name)
+    embedder.encode(['warm up'])
+    return embedder
+
+register_provider('sentence-transformers',
+                  lambda: SentenceTransformerEmbedder(os.getenv('EMBEDDING_MODEL', DEFAULT_ST_MODEL)))
+register_provider(FALLBACK_PROVIDER, HashingEmbedder)
@@ -0,0 +1,146 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+
+"""Process-wide retrieval engine.
+
+RetrievalEngine owns everything a query needs: the chunk store, the dense and
+BM25 indexes and the retrievers built on them. They are bundled into an
+immutable RetrievalSnapshot that is replaced as a whole (a single reference
+assignment) when the chunk file changes, so concurrent sessions always search
+one consistent index version and never observe a half-built one. Queries only
+search; loading and building happen in refresh(), serialised by a lock. A
+replaced snapshot's chunk file (open file and memory map) is closed once the
+last reader holding it lets go.
+"""
+import logging
+import threading
+import time
+import weakref
+from typing import Optional, Sequence
+from retrieval.bm25 import BM25Index, load_or_build_bm25
+from retrieval.cache import RESULTS, cache_stats
+from retrieval.chunk_store import chunks_path, open_chunks
+from retrieval.retriever import HybridRetriever, SimpleRetriever
+from retrieval.vector_store import InMemoryVectorStore, content_hash, open_index
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('hybrid', 'vector', 'simple')
+
+def _close_chunks(chunks):
+    close = getattr(chunks, 'close', None)
+    if close is not None:
+        close()
+
+class RetrievalSnapshot:
+    """One consistent index version; never mutated after construction. The chunk
+    store is closed by close(), or when the snapshot is garbage collected."""
+    def __init__(self, chunks_hash: Optional[str], chunks: Sequence, store: InMemoryVectorStore,
+                 bm25: Optional[BM25Index], simple: SimpleRetriever, hybrid: HybridRetriever):
+        self.chunks_hash = chunks_hash
+        self.chunks = chunks
+        self.store = store
+        self.bm25 = bm25
+        self.simple = simple
+        self.hybrid = hybrid
+        self._finalizer = weakref.finalize(self, _close_chunks, chunks)
+
+    def close(self):
+        self._finalizer()
+
+def load_snapshot(folder: str, chunks_hash: Optional[str]) -> RetrievalSnapshot:
+    chunks = open_chunks(folder)
+    chunks = chunks if chunks is not None else []
+    store = open_index(folder, chunks=chunks)
+    bm25 = load_or_build_bm25(folder)
+    return RetrievalSnapshot(chunks_hash, chunks, store, bm25, SimpleRetriever(chunks),
+                             HybridRetriever(chunks, bm25=bm25, store=store))
+
+class RetrievalEngine:
+    """Thread-safe facade over the current RetrievalSnapshot of `folder`.
+    The chunk file is re-checked at most every `check_interval` seconds."""
+    def __init__(self, folder: str = "data/processed", check_interval: float = 2.0):
+        self.folder = folder
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked = 0.0
+        self._reload_lock = threading.Lock()
+        self.refresh(force=True)
+
+    def _current_hash(self) -> Optional[str]:
+        path = chunks_path(self.folder)
+        try:
+            return content_hash(path)
+        except FileNotFoundError:
+            return None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Load a new snapshot if the chunk file changed; returns True if swapped."""
+        with self._reload_lock:
+            return self._refresh_locked(force)
+
+    def _refresh_locked(self, force: bool = False) -> bool:
+        self._checked = time.monotonic()
+        chunks_hash = self._current_hash()
+        if not force and self._snapshot is not None and chunks_hash == self._snapshot.chunks_hash:
+            return False
+        snapshot = load_snapshot(self.folder, chunks_hash)
+        old, self._snapshot = self._snapshot, snapshot
+        if old is not None:
+            # In-flight readers keep `old` alive; its chunk store closes when the last one finishes.
+            # Old entries are unreachable (their keys carry the old versions)
+            RESULTS.clear()
+            logger.info(f'Retrieval engine switched to chunk version {str(chunks_hash)[:12]}')
+        return True
+
+    def _background_refresh(self):
+        try:
+            self._refresh_locked()
+        except Exception as e:
+            # Keep serving the previous version if the new one fails to load
+            logger.warning(f'Retrieval engine refresh failed: {e}')
+        finally:
+            self._reload_lock.release()
+
+    def snapshot(self) -> RetrievalSnapshot:
+        """The current snapshot; hold on to it to run several searches on one version.
+        A changed chunk file is picked up by a background reload, so callers never
+        wait for an index build."""
+        now = time.monotonic()
+        if now - self._checked > self.check_interval and self._reload_lock.acquire(blocking=False):
+            self._checked = now
+            threading.Thread(target=self._background_refresh, name='retrieval-refresh', daemon=True).start()
+        return self._snapshot
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.snapshot().chunks_hash
+
+    def __len__(self):
+        return len(self.snapshot().chunks)
+
+    def search(self, query: str, method: str = 'hybrid', k: int = 5, filters: Optional[dict] = None):
+        snap = self.snapshot()
+        if method == 'simple':
+            return snap.simple.search(query, k=k, filters=filters)
+        if method == 'vector':
+            return snap.store.search(query, top_k=k, filters=filters)
+        if method == 'hybrid':
+            return snap.hybrid.search(query, k=k, filters=filters)
+        raise ValueError(f'Unknown retrieval method: {method}')
+
+    def sources(self):
+        """Source names that can be used in {"source": ...} filters."""
+        return self.snapshot().store.metadata.source_names
+
+    def close(self):
+        with self._reload_lock:
+            if self._snapshot is not None:
+                self._snapshot.close()
+
+    def stats(self) -> dict:
+        snap = self.snapshot()
+        return {"chunks": len(snap.chunks), "chunks_hash": snap.chunks_hash, **cache_stats()}
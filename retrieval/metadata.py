@@ -0,0 +1,118 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+"""Columnar chunk metadata for pre-filtered search.
+
+Sources (and optional per-chunk tags) are dictionary-encoded, and the sorted row
+ids of every source and tag are precomputed, so a filter resolves to its rows
+by lookup before any scoring happens. Chunks are written file by file, so a
+source's rows are usually one contiguous range; search then scores slice
+views of the embedding matrix without copying it.
+
+Filters are dicts; fields are ANDed and the values of one field are ORed:
+    {"source": "nhs_*"}
+    {"source": ["who.txt", "cdc.txt"], "tag": "sleep"}
+    {"chunk_id": [0, 1]}
+Source and tag values may be glob patterns.
+"""
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from retrieval.cache import LRUCache
+
+FIELDS = ('source', 'tag', 'chunk_id')
+
+def _values(v) -> list:
+    return list(v) if isinstance(v, (list, tuple, set, frozenset)) else [v]
+
+def filter_key(filters: Optional[dict]):
+    """Hashable, order-independent form of `filters` for cache keys (None if empty)."""
+    if not filters:
+        return None
+    return tuple(sorted((field, tuple(sorted(map(str, _values(v))))) for field, v in filters.items()))
+
+def _postings(values: Sequence) -> Dict[str, np.ndarray]:
+    rows = {}
+    for i, v in enumerate(values):
+        rows.setdefault(v, []).append(i)
+    return {v: np.array(r, dtype='int64') for v, r in rows.items()}
+
+class MetadataIndex:
+    def __init__(self, sources: Sequence[str], chunk_ids: Sequence, tags: Optional[Sequence] = None):
+        self.n_rows = len(sources)
+        self.source_names = sorted(set(sources))
+        codes = {s: i for i, s in enumerate(self.source_names)}
+        self.source_codes = np.array([codes[s] for s in sources], dtype='int32')
+        self.chunk_ids = np.array([-1 if c is None else int(c) for c in chunk_ids], dtype='int64')
+        self.source_rows = _postings(sources)
+        tag_rows = {}
+        for i, row_tags in enumerate(tags or ()):
+            for t in row_tags or ():
+                tag_rows.setdefault(t, []).append(i)
+        self.tag_rows = {t: np.array(r, dtype='int64') for t, r in tag_rows.items()}
+        self._masks = LRUCache(maxsize=64)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[dict]):
+        sources, chunk_ids, tags = [], [], []
+        for c in chunks:
+            sources.append(c.get('source', ''))
+            chunk_ids.append(c.get('chunk_id'))
+            tags.append(c.get('tags'))
+        return cls(sources, chunk_ids, tags)
+
+    @staticmethod
+    def _match(postings: Dict[str, np.ndarray], patterns: List) -> np.ndarray:
+        parts = []
+        for p in patterns:
+            p = str(p)
+            if any(ch in p for ch in '*?['):
+                parts += [rows for name, rows in postings.items() if fnmatchcase(name, p)]
+            elif p in postings:
+                parts.append(postings[p])
+        if not parts:
+            return np.empty(0, dtype='int64')
+        return parts[0] if len(parts) == 1 else np.unique(np.concatenate(parts))
+
+    def rows(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Sorted ids of the rows matching `filters`; None means every row."""
+        if not filters:
+            return None
+        result = None
+        for field, value in filters.items():
+            if field == 'source':
+                rows = self._match(self.source_rows, _values(value))
+            elif field == 'tag':
+                rows = self._match(self.tag_rows, _values(value))
+            elif field == 'chunk_id':
+                rows = np.flatnonzero(np.isin(self.chunk_ids, [int(v) for v in _values(value)]))
+            else:
+                raise ValueError(f'Unknown filter field: {field} (use one of {", ".join(FIELDS)})')
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+    def mask(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Boolean bitmap of the matching rows (memoised per filter); None means every row."""
+        key = filter_key(filters)
+        if key is None:
+            return None
+        def compute():
+            bitmap = np.zeros(self.n_rows, dtype=bool)
+            bitmap[self.rows(filters)] = True
+            return bitmap
+        return self._masks.get_or_compute(key, compute)
+
+def row_ranges(rows: np.ndarray, max_ranges: Optional[int] = None) -> Optional[List[tuple]]:
+    """Split sorted row ids into contiguous [start, stop) ranges (None if more than `max_ranges`)."""
+    if len(rows) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    if max_ranges is not None and len(breaks) + 1 > max_ranges:
+        return None
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(rows)]])
+    return [(int(rows[a]), int(rows[b - 1]) + 1) for a, b in zip(starts, stops)]
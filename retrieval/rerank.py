@@ -5,8 +5,39 @@
 
 
 """
-Reranking module: simple lexical overlap heuristic.
+Reranking module.
+- rerank_by_overlap: simple lexical overlap heuristic (re-tokenises every call)
+- TokenSetReranker: same score, but chunk token sets are computed once and cached
+- CrossEncoderReranker: optional sentence-transformers cross-encoder; all
+  candidates are scored in one batched forward pass and (query, chunk) scores cached
+- BudgetedReranker: runs a reranker under a time budget and falls back to a
+  cheap one when the budget is exceeded, so reranking never dominates tail latency
+
+Configuration: RERANKER (overlap | tokenset | cross-encoder, default tokenset),
+RERANKER_MODEL, RERANK_BUDGET_MS.
 """
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Optional
+from retrieval.cache import LRUCache
+from retrieval.query_rewrite import normalize_query
+from monitoring.tracing import count, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CROSS_ENCODER = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+def _text(c) -> str:
+    return c.get("text", "") if isinstance(c, dict) else c
+
+def _chunk_key(c):
+    # The text hash keeps keys valid when a re-ingested file reuses chunk ids
+    if isinstance(c, dict) and c.get("chunk_id") is not None:
+        return (c.get("source"), c.get("chunk_id"), hash(_text(c)))
+    return _text(c)
 
 def rerank_by_overlap(candidates, query):
     qset = set(query.lower().split())
@@ -18,3 +49,143 @@ def rerank_by_overlap(candidates, query):
         scored.append((overlap, c))
     scored.sort(reverse=True, key=lambda x: x[0])
     return [c for _, c in scored]
+
+class Reranker(ABC):
+    """Scores (query, candidate) pairs; rerank() orders candidates by score,
+    keeping the retrieval order among equal scores."""
+    name = 'base'
+
+    @abstractmethod
+    def score(self, query: str, candidates: list) -> List[float]:
+        """One relevance score per candidate (higher is better)."""
+
+    def rerank(self, query: str, candidates: list, top_k: Optional[int] = None) -> list:
+        if not candidates:
+            return []
+        with span("rerank"):
+            scores = self.score(query, candidates)
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return [candidates[i] for i in order][:top_k]
+
+class OverlapReranker(Reranker):
+    name = 'overlap'
+
+    def score(self, query, candidates):
+        qset = set(query.lower().split())
+        return [len(qset & set(_text(c).lower().split())) for c in candidates]
+
+class TokenSetReranker(Reranker):
+    """Word-overlap score from token sets memoised per chunk."""
+    name = 'tokenset'
+
+    def __init__(self, maxsize: int = 100_000):
+        self._sets = LRUCache(maxsize=maxsize)
+
+    def token_set(self, c) -> frozenset:
+        return self._sets.get_or_compute(_chunk_key(c), lambda: frozenset(_text(c).lower().split()))
+
+    def precompute(self, chunks):
+        for c in chunks:
+            self.token_set(c)
+
+    def score(self, query, candidates):
+        qset = frozenset(query.lower().split())
+        return [len(qset & self.token_set(c)) for c in candidates]
+
+class CrossEncoderReranker(Reranker):
+    """Cross-encoder relevance scores. `model` may be any object with
+    predict(pairs, batch_size=...); by default a sentence-transformers
+    CrossEncoder is loaded on first use."""
+    name = 'cross-encoder'
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER, model=None, batch_size: int = 64, cache_size: int = 50_000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = model
+        self._load_lock = threading.Lock()
+        self.cache = LRUCache(maxsize=cache_size, ttl=3600)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+        return self._model
+
+    def score(self, query, candidates):
+        qkey = normalize_query(query)
+        keys = [(self.model_name, qkey, _chunk_key(c)) for c in candidates]
+        scores = [self.cache.get(k) for k in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if missing:
+            # One batched forward pass for every uncached candidate
+            pairs = [(query, _text(candidates[i])) for i in missing]
+            predicted = self.model.predict(pairs, batch_size=max(self.batch_size, len(pairs)))
+            for i, s in zip(missing, predicted):
+                scores[i] = float(s)
+                self.cache.set(keys[i], scores[i])
+        return scores
+
+class BudgetedReranker(Reranker):
+    """Use `primary` if it answers within `budget_ms`, else `fallback`. A late
+    primary call keeps running in the background and still fills its cache.
+    At most `workers` primary calls are in flight (running or late); while all
+    of them are busy, requests go straight to `fallback` instead of queueing
+    more stale work."""
+    def __init__(self, primary: Reranker, fallback: Reranker, budget_ms: float = 50.0, workers: int = 2):
+        self.primary = primary
+        self.fallback = fallback
+        self.budget_ms = budget_ms
+        self.name = f'{primary.name}+{fallback.name}'
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rerank')
+        self._slots = threading.BoundedSemaphore(workers)
+        self.fallbacks = 0
+
+    def _run_primary(self, query, candidates):
+        try:
+            return self.primary.score(query, candidates)
+        finally:
+            self._slots.release()
+
+    def score(self, query, candidates):
+        if not self._slots.acquire(blocking=False):
+            self.fallbacks += 1
+            count("rerank.fallbacks")
+            return self.fallback.score(query, candidates)
+        future = self._pool.submit(self._run_primary, query, candidates)
+        try:
+            return future.result(timeout=self.budget_ms / 1000.0)
+        except FutureTimeout:
+            logger.info(f'{self.primary.name} reranker exceeded {self.budget_ms:.0f} ms budget; using {self.fallback.name}')
+        except Exception as e:
+            logger.warning(f'{self.primary.name} reranker failed; using {self.fallback.name}: {e}')
+        self.fallbacks += 1
+        count("rerank.fallbacks")
+        return self.fallback.score(query, candidates)
+
+_RERANKERS = {}
+_LOCK = threading.Lock()
+
+def get_reranker(name: Optional[str] = None) -> Reranker:
+    """Shared reranker for `name` (default: RERANKER env var, else tokenset)."""
+    name = name or os.getenv('RERANKER', TokenSetReranker.name)
+    inst = _RERANKERS.get(name)
+    if inst is not None:
+        return inst
+    with _LOCK:
+        inst = _RERANKERS.get(name)
+        if inst is None:
+            if name == OverlapReranker.name:
+                inst = OverlapReranker()
+            elif name == TokenSetReranker.name:
+                inst = TokenSetReranker()
+            elif name == CrossEncoderReranker.name:
+                inst = BudgetedReranker(CrossEncoderReranker(os.getenv('RERANKER_MODEL', DEFAULT_CROSS_ENCODER)),
+                                        TokenSetReranker(),
+                                        budget_ms=float(os.getenv('RERANK_BUDGET_MS', '50')))
+            else:
+                raise KeyError(f'Unknown reranker: {name}')
+            _RERANKERS[name] = inst
+    return inst
@@ -5,28 +5,198 @@
 
 
 """Retrieval strategies with query rewriting integration."""
-from typing import List
+from typing import List, Optional
+import numpy as np
 from retrieval.vector_store import search as vector_search
-from retrieval.rerank import rerank_by_overlap
-from retrieval import query_rewrite
+from retrieval.bm25 import BM25Index
+from retrieval import query_rewrite, vector_store
+from retrieval.cache import cached_results, new_version
+from retrieval.metadata import MetadataIndex, filter_key
+from monitoring.tracing import span, traced
 
 class SimpleRetriever:
+    """Case-insensitive substring match ("query in text"), served from an index.
+
+    The lowercase corpus is computed once. Each whitespace token maps to the
+    (sorted) ids of the chunks containing it, and token trigrams map to tokens,
+    so a query's words are resolved to candidate chunks by lookup. Candidates
+    are then verified with a real substring test, in corpus order, stopping
+    at k, which keeps results identical to a full scan. `filters` (see
+    retrieval/metadata.py) drop non-matching candidates before verification.
+    """
     def __init__(self, chunks: List[dict]):
         self.chunks = chunks
+        self._lowered = [c['text'].lower() for c in chunks]
+        postings = {}
+        for doc_id, text in enumerate(self._lowered):
+            for tok in set(text.split()):
+                postings.setdefault(tok, []).append(doc_id)
+        self._tokens = list(postings)
+        self._token_ids = {t: i for i, t in enumerate(self._tokens)}
+        self._postings = [np.array(postings[t], dtype='int32') for t in self._tokens]
+        grams = {}
+        for tok_id, tok in enumerate(self._tokens):
+            for g in {tok[i:i + 3] for i in range(len(tok) - 2)}:
+                grams.setdefault(g, []).append(tok_id)
+        self._grams = {g: np.array(ids, dtype='int32') for g, ids in grams.items()}
+        self._metadata = None
+        self.version = new_version()
+
+    @property
+    def metadata(self) -> MetadataIndex:
+        if self._metadata is None:
+            self._metadata = MetadataIndex.from_chunks(self.chunks)
+        return self._metadata
+
+    def _tokens_containing(self, part: str):
+        """Ids of vocabulary tokens that contain `part` as a substring."""
+        if len(part) < 3:
+            return [i for i, t in enumerate(self._tokens) if part in t]
+        cand = None
+        for g in {part[i:i + 3] for i in range(len(part) - 2)}:
+            ids = self._grams.get(g)
+            if ids is None:
+                return []
+            cand = ids if cand is None else np.intersect1d(cand, ids, assume_unique=True)
+        return [int(i) for i in cand if part in self._tokens[i]]
+
+    def _candidates(self, q: str):
+        if any(ch.isspace() and ch != ' ' for ch in q):
+            return range(len(self.chunks))  # tokens never contain newlines/tabs: verify everything
+        parts = q.split(' ')
+        cand = None
+        for pos, part in enumerate(parts):
+            if not part:
+                continue
+            if 0 < pos < len(parts) - 1:
+                # Interior words are bounded by spaces on both sides: exact token
+                tok_id = self._token_ids.get(part)
+                tok_ids = [] if tok_id is None else [tok_id]
+            else:
+                tok_ids = self._tokens_containing(part)
+            if not tok_ids:
+                return []
+            docs = np.unique(np.concatenate([self._postings[i] for i in tok_ids]))
+            cand = docs if cand is None else np.intersect1d(cand, docs, assume_unique=True)
+            if len(cand) == 0:
+                return []
+        return range(len(self.chunks)) if cand is None else cand
 
-    def search(self, query: str, k: int = 3):
+    @traced("retrieve.simple")
+    def search(self, query: str, k: int = 3, filters: Optional[dict] = None):
         q = query.lower()
-        matches = [c for c in self.chunks if q in c['text'].lower()]
-        return matches[:k]
+        key = ("simple", q, k, filter_key(filters), self.version)
+        return cached_results(key, lambda: self._search(q, k, filters))
+
+    def _search(self, q: str, k: int, filters: Optional[dict] = None):
+        allowed = self.metadata.mask(filters)
+        matches = []
+        for doc_id in self._candidates(q):
+            if allowed is not None and not allowed[doc_id]:
+                continue
+            if q in self._lowered[doc_id]:
+                matches.append(self.chunks[doc_id])
+                if len(matches) >= k:
+                    break
+        return matches
+
+def _fusion_key(c: dict):
+    """Identity of a chunk across indexes; chunks without a chunk_id fall back to their text."""
+    if c.get("chunk_id") is None:
+        return c.get("source"), c.get("text", "")
+    return c.get("source"), c["chunk_id"]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60):
+    """Fuse ranked key lists: score(key) = sum over lists of 1 / (rrf_k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return fused
+
+def weighted_fusion(scored: List[dict], weights: List[float]):
+    """Fuse {key: score} maps after min-max normalising each one to [0, 1]."""
+    fused = {}
+    for scores, w in zip(scored, weights):
+        if not scores:
+            continue
+        lo, hi = min(scores.values()), max(scores.values())
+        span = (hi - lo) or 1.0
+        for key, s in scores.items():
+            fused[key] = fused.get(key, 0.0) + w * (s - lo) / span
+    return fused
 
 class HybridRetriever:
-    def __init__(self, chunks: List[dict]):
+    """BM25 (sparse) + dense vector retrieval combined by score fusion.
+
+    fusion="rrf" uses reciprocal-rank fusion; fusion="weighted" mixes min-max
+    normalised scores as alpha * dense + (1 - alpha) * bm25. Pass a prebuilt
+    (e.g. persisted) `bm25` index to avoid indexing `chunks` on construction,
+    and a `store` to search instead of the module-level vector index.
+    `filters` are applied inside both searches, before scoring.
+    """
+    def __init__(self, chunks: List[dict], bm25: Optional[BM25Index] = None, fusion: str = "rrf",
+                 alpha: float = 0.5, rrf_k: int = 60, candidates: int = 10,
+                 store: Optional["vector_store.InMemoryVectorStore"] = None):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
         self.chunks = chunks
+        self.bm25 = bm25 if bm25 is not None else BM25Index.build(chunks)
+        self.fusion = fusion
+        self.alpha = alpha
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.store = store
+        self._metadata = None
+
+    @property
+    def metadata(self) -> MetadataIndex:
+        # Built from `chunks` (BM25 doc ids), whose order may differ from the vector store's rows
+        if self._metadata is None:
+            self._metadata = MetadataIndex.from_chunks(self.chunks)
+        return self._metadata
+
+    def _vector_search(self, query: str, top_k: int, filters: Optional[dict] = None):
+        if self.store is not None:
+            return self.store.search(query, top_k, filters)
+        return vector_search(query, top_k=top_k, filters=filters)
 
-    def search(self, query: str, k: int = 3):
+    @traced("retrieve.hybrid")
+    def search(self, query: str, k: int = 3, filters: Optional[dict] = None):
+        # Results depend only on the normalised query, the filters and both index versions
+        store = self.store if self.store is not None else vector_store.VSTORE
+        key = ("hybrid", query_rewrite.normalize_query(query), k, filter_key(filters), self.bm25.version,
+               store.version, self.fusion, self.alpha, self.rrf_k, self.candidates)
+        return cached_results(key, lambda: self._search(query, k, filters))
+
+    def _search(self, query: str, k: int, filters: Optional[dict] = None):
         # rewrite and expand query
-        expanded = query_rewrite.expand_query(query)
-        candidates = vector_search(expanded, top_k=10)
-        # simple rerank by overlap with original query
-        reranked = rerank_by_overlap(candidates, query)
-        return reranked[:k]
+        with span("query_rewrite"):
+            expanded = query_rewrite.expand_query(query)
+        depth = max(self.candidates, k)
+        dense = self._vector_search(expanded, depth, filters)
+        with span("bm25.search"):
+            sparse = self.bm25.search(expanded, top_k=depth, mask=self.metadata.mask(filters))
+
+        # Fuse on (source, chunk_id) so the two indexes need not share row order
+        # and chunks with the same text in different documents stay apart
+        docs = {}
+        dense_scores = {}
+        for r in dense:
+            key = _fusion_key(r)
+            docs.setdefault(key, r)
+            dense_scores[key] = r["score"]
+        sparse_scores = {}
+        for doc_id, score in sparse:
+            c = self.chunks[doc_id]
+            key = _fusion_key(c)
+            docs[key] = c
+            sparse_scores[key] = score
+
+        with span("fusion"):
+            if self.fusion == "rrf":
+                fused = reciprocal_rank_fusion([list(dense_scores), list(sparse_scores)], rrf_k=self.rrf_k)
+            else:
+                fused = weighted_fusion([dense_scores, sparse_scores], [self.alpha, 1.0 - self.alpha])
+            ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [{**docs[key], "score": score} for key, score in ranked]
@@ -7,3 +7,102 @@
 def test_ingestion_runs():
     # Smoke test for ingestion script
     assert True
+
+def test_stream_chunks_match_chunk_text_with_offsets(tmp_path):
+    from ingestion.utils import chunk_text, clean_text, stream_chunks
+    words = [f"wörd{i}," if i % 7 else f"w{i}" for i in range(460)]
+    text = "\n  " + "".join(w + ("\r\n" if i % 11 == 0 else "  ") for i, w in enumerate(words))
+    path = tmp_path / "guide.txt"
+    path.write_text(text, encoding="utf-8")
+    chunks = list(stream_chunks(path, chunk_size=200, overlap=50))
+    assert [c.text for c in chunks] == chunk_text(clean_text(text), chunk_size=200, overlap=50)
+    assert [len(c.text.split()) for c in chunks] == [200, 200, 160]
+    assert chunks[1].text.split()[:50] == chunks[0].text.split()[-50:]
+    for c in chunks:
+        # Offsets are exact character positions in the source text
+        assert clean_text(text[c.start:c.end]) == c.text and text[c.start:c.end] == text[c.start:c.end].strip()
+    assert chunks[2].to_dict("guide.txt") == {"source": "guide.txt", "chunk_id": 2, "text": chunks[2].text,
+                                               "start": chunks[2].start, "end": len(text.rstrip())}
+    (tmp_path / "empty.txt").write_text(" \n", encoding="utf-8")
+    assert list(stream_chunks(tmp_path / "empty.txt")) == []
+
+def test_stream_chunks_split_on_unicode_whitespace(tmp_path):
+    from ingestion.utils import chunk_text, clean_text, stream_chunks
+    # NBSP and other non-ASCII spaces, next to words sharing their UTF-8 lead bytes (… € 、 ¢);
+    # the long leading run of spaces and the long word do not fit in the first decoded block
+    seps = ["\xa0", " ", "\u3000", "\u2009", "\x85", "\x1c", "\u202f \n"]
+    words = [("…€", "a、b", "¢", "x")[i % 4] + str(i) for i in range(75)]
+    words[40] = "ü" * 700
+    text = "\xa0" * 600 + "".join(w + seps[i % len(seps)] for i, w in enumerate(words))
+    path = tmp_path / "nbsp.txt"
+    path.write_text(text, encoding="utf-8")
+    chunks = list(stream_chunks(path, chunk_size=30, overlap=5))
+    assert [c.text for c in chunks] == chunk_text(clean_text(text), chunk_size=30, overlap=5)
+    assert [len(c.text.split()) for c in chunks] == [30, 30, 25]
+    for c in chunks:
+        assert clean_text(text[c.start:c.end]) == c.text and text[c.start:c.end] == text[c.start:c.end].strip()
+
+def test_incremental_ingestion_only_reprocesses_changed_files(tmp_path, monkeypatch):
+    import json
+    import numpy as np
+    from ingestion import ingest_data
+    from retrieval.chunk_store import iter_chunks
+    from retrieval.vector_store import InMemoryVectorStore, content_hash
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "fallback")
+    src, out = tmp_path / "raw", tmp_path / "processed"
+    src.mkdir()
+    (src / "a.txt").write_text("Sleep hygiene helps with anxiety and stress.", encoding="utf-8")
+    (src / "b.txt").write_text("Breathing exercises calm the nervous system.", encoding="utf-8")
+    # A small corpus is processed in-process by default (no pool, no per-worker model load)
+    monkeypatch.setattr(ingest_data, "ProcessPoolExecutor", None)
+    monkeypatch.setattr(ingest_data, "COPY_BLOCK", 1)
+    ingest_data.main(str(src), str(out))
+
+    processed = []
+    original = ingest_data.process_file
+    monkeypatch.setattr(ingest_data, "process_file", lambda path, embed=True: processed.append(path) or original(path, embed))
+    (src / "b.txt").write_text("Mindfulness practice reduces rumination.", encoding="utf-8")
+    (src / "c.txt").write_text("Talk to a professional when symptoms persist.", encoding="utf-8")
+    ingest_data.main(str(src), str(out), incremental=True, workers=1)
+
+    assert sorted(p.rsplit("/", 1)[-1] for p in processed) == ["b.txt", "c.txt"]
+    chunks = list(iter_chunks(str(out)))
+    assert sorted(c["source"] for c in chunks) == ["a.txt", "b.txt", "c.txt"]
+    store = InMemoryVectorStore.load(str(out))
+    assert store.chunks_hash == content_hash(out / "chunks.jsonl")
+    assert store.texts == [c["text"] for c in chunks]
+    assert store.search("mindfulness rumination", top_k=1)[0]["text"] == "Mindfulness practice reduces rumination."
+    # Kept and new rows were copied into the index block by block, in chunk-file order
+    ingest_data.main(str(src), str(tmp_path / "full"))
+    full = InMemoryVectorStore.load(str(tmp_path / "full"))
+    assert np.allclose(store.embeddings, full.embeddings) and store.sources == full.sources
+    assert not list(out.glob("spool-*"))
+    manifest = json.loads((out / "manifest.json").read_text(encoding="utf-8"))
+    assert set(manifest["files"]) == {"a.txt", "b.txt", "c.txt"}
+
+    # Nothing changed: no output is rewritten (readers would reload on a new mtime)
+    processed.clear()
+    before = {p.name: p.stat().st_mtime_ns for p in out.rglob("*") if p.is_file()}
+    ingest_data.main(str(src), str(out), incremental=True, workers=1)
+    assert processed == [] and {p.name: p.stat().st_mtime_ns for p in out.rglob("*") if p.is_file()} == before
+
+def test_pool_workers_stream_batches_through_spool_files(tmp_path, monkeypatch):
+    from ingestion import ingest_data
+    from retrieval.chunk_store import iter_chunks
+    from retrieval.vector_store import InMemoryVectorStore
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "fallback")
+    monkeypatch.setattr(ingest_data, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(ingest_data, "OVERLAP", 1)
+    monkeypatch.setattr(ingest_data, "EMBED_BATCH", 2)
+    src = tmp_path / "raw"
+    src.mkdir()
+    for name in ("a", "b", "c"):
+        (src / f"{name}.txt").write_text(" ".join(f"{name}{i}" for i in range(20)), encoding="utf-8")
+    assert [len(b) for b, _ in ingest_data.process_file(str(src / "a.txt"))] == [2, 2, 2, 1]
+    ingest_data.main(str(src), str(tmp_path / "serial"), workers=1)
+    ingest_data.main(str(src), str(tmp_path / "pool"), workers=2)
+    assert list(iter_chunks(str(tmp_path / "pool"))) == list(iter_chunks(str(tmp_path / "serial")))
+    assert len(list(iter_chunks(str(tmp_path / "pool")))) == 21
+    serial, pool = (InMemoryVectorStore.load(str(tmp_path / d)) for d in ("serial", "pool"))
+    assert (serial.embeddings == pool.embeddings).all()
+    assert not list((tmp_path / "pool").glob("spool-*"))
@@ -0,0 +1,108 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+import asyncio
+import pytest
+
+def _service(tmp_path, **pool_args):
+    from interface.api import AssistantService, WorkerPool
+    from retrieval.chunk_store import write_chunks
+    from retrieval.engine import RetrievalEngine
+    write_chunks(str(tmp_path), [{"source": "a.txt", "chunk_id": 0, "text": "Depression is common and treatable."},
+                                 {"source": "b.txt", "chunk_id": 0, "text": "Anxiety responds to breathing exercises."}])
+    return AssistantService(engine=RetrievalEngine(str(tmp_path)), pool=WorkerPool(**pool_args))
+
+def test_api_service_retrieve_answer_and_batch(tmp_path, monkeypatch):
+    from llm.query_llm import MOCK_ANSWER
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    service = _service(tmp_path)
+    out = asyncio.run(service.retrieve("breathing", method="simple", k=1))
+    assert out["results"][0]["source"] == "b.txt"
+    out = asyncio.run(service.answer("anxiety breathing"))
+    assert out["answer"] == MOCK_ANSWER and out["sources"]
+    out = asyncio.run(service.answer_batch(["depression", "anxiety"], method="vector"))
+    assert [a["query"] for a in out["answers"]] == ["depression", "anxiety"]
+    out = asyncio.run(service.retrieve("anxiety breathing", method="hybrid", k=2, filters={"source": "a.txt"}))
+    assert [(r["source"], r["chunk_id"]) for r in out["results"]] == [("a.txt", 0)]
+    with pytest.raises(ValueError):
+        asyncio.run(service.retrieve("x", method="nope"))
+
+def test_rerank_and_context_run_off_the_event_loop(tmp_path, monkeypatch):
+    import threading, time
+    from interface import api
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    threads = []
+
+    class SlowReranker:
+        def rerank(self, query, results):
+            threads.append(threading.current_thread().name)
+            time.sleep(0.2)
+            if query == "fail":
+                raise RuntimeError("model unavailable")
+            return results[::-1]
+
+    monkeypatch.setattr(api, "get_reranker", lambda: SlowReranker())
+    compose = api.compose_prompt
+    monkeypatch.setattr(api, "compose_prompt", lambda *a, **kw: threads.append(threading.current_thread().name)
+                        or compose(*a, **kw))
+    service = _service(tmp_path, workers=4)
+
+    async def scenario():
+        start = time.perf_counter()
+        out = await asyncio.gather(*[service.answer(q, method="vector", k=2) for q in ("anxiety", "depression", "fail")])
+        return out, time.perf_counter() - start
+
+    (first, _, failed), elapsed = asyncio.run(scenario())
+    # Three reranks overlapped instead of blocking the loop one after another
+    assert elapsed < 0.45 and len(threads) == 6 and all(t.startswith("api-worker") for t in threads)
+    assert len(first["sources"]) == 2 and len(failed["sources"]) == 2  # a failing reranker keeps the retrieval order
+
+def test_worker_pool_timeout_and_backpressure():
+    from interface.api import Overloaded, RequestTimeout, WorkerPool
+    pool = WorkerPool(workers=1, queue_size=1, timeout=0.5)
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def scenario():
+        calls = [pool.submit(slow) for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    # One runs, one waits for the slot, the third is rejected immediately
+    assert results[:2] == ["done", "done"] and isinstance(results[2], Overloaded)
+    with pytest.raises(RequestTimeout):
+        asyncio.run(pool.submit(lambda: asyncio.sleep(2)))
+    assert pool.pending == 0
+
+def test_http_routes(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    from interface.api import create_app
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with TestClient(create_app(_service(tmp_path))) as client:
+        assert client.get("/health").json()["chunks"] == 2
+        assert client.post("/retrieve", json={"query": "depression", "method": "simple"}).json()["results"]
+        assert client.post("/answer:batch", json={"queries": ["anxiety"]}).status_code == 200
+        assert client.post("/retrieve", json={"query": ""}).status_code == 400
+        out = client.post("/answer", json={"query": "anxiety", "context_k": 1}).json()
+        assert len(out["sources"]) == 1 and "tokens_saved" in out["context"]
+        for bad in (0, -1, 1000):
+            assert client.post("/answer", json={"query": "anxiety", "context_k": bad}).status_code == 400
+            assert client.post("/answer:batch", json={"queries": ["anxiety"], "context_k": bad}).status_code == 400
+        # Upstream LLM down (key set, retries exhausted): 502, not a mocked 200
+        from llm import query_llm
+        from llm.client import LLMError
+
+        class DownClient:
+            async def acomplete(self, *args, **kwargs):
+                raise LLMError("upstream unavailable")
+
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(query_llm, "get_client", lambda: DownClient())
+        resp = client.post("/answer", json={"query": "anxiety breathing"})
+        assert resp.status_code == 502 and "upstream unavailable" in resp.json()["detail"]
+        assert client.post("/answer:batch", json={"queries": ["anxiety"]}).status_code == 502
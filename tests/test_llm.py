@@ -9,3 +9,221 @@ from llm.query_llm import query_openai
 def test_llm_mock():
     out = query_openai("Test")
     assert "Mocked LLM answer" in out
+
+def test_context_builder_merges_dedupes_and_budgets(monkeypatch):
+    from llm import context
+    from llm.context import build_context, count_tokens
+    from llm.prompt_templates import compose_prompt
+    # Token counts below assume the estimate, whether or not tiktoken is installed
+    monkeypatch.setenv("CONTEXT_TOKENIZER", "estimate")
+    monkeypatch.setattr(context, "_encoding", None)
+    assert context.warm_up() == "estimate" and count_tokens("Don't panic.") == 5
+    words = [f"w{i}" for i in range(300)]
+    chunks = [{"source": "a.txt", "chunk_id": 1, "text": " ".join(words[150:300])},
+              {"source": "b.txt", "chunk_id": 0, "text": "Slow breathing exercises help manage anxiety."},
+              {"source": "a.txt", "chunk_id": 0, "text": " ".join(words[:200])},
+              {"source": "c.txt", "chunk_id": 4, "text": "Slow breathing exercises help manage anxiety!"},
+              {"source": "a.txt", "chunk_id": 1, "text": " ".join(words[150:300])}]
+    passages, stats = build_context(chunks, budget=0)
+    # a.txt chunks 0 and 1 overlap by 50 words: merged once, in document order, ranked first
+    assert passages[0] == {"text": " ".join(words), "source": "a.txt", "chunk_ids": [0, 1]}
+    assert [p["source"] for p in passages] == ["a.txt", "b.txt"]
+    assert stats["merged"] == 1 and stats["duplicates"] == 2
+    assert stats["tokens_saved"] == stats["tokens_in"] - stats["tokens"] > 0
+
+    passages, stats = build_context(chunks, budget=100)
+    assert stats["truncated"] == 1 and stats["dropped"] == 1 and stats["tokens"] <= 100
+    assert passages[0]["text"] == " ".join(words[:count_tokens(passages[0]["text"])])
+
+    stats = {}
+    prompt = compose_prompt("How to calm down?", chunks[1:2], stats=stats)
+    assert "Slow breathing exercises help manage anxiety." in prompt and stats["tokens_saved"] == 0
+
+def test_response_cache_and_coalescing(monkeypatch, tmp_path):
+    import threading, time
+    from llm import query_llm
+    from llm.response_cache import MemoryResponseCache, SQLiteResponseCache, TieredResponseCache
+    calls = []
+
+    def fake_call(prompt, model, max_tokens, temperature):
+        calls.append(prompt)
+        time.sleep(0.05)
+        return f"answer to {prompt}"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(query_llm, "httpx", object())
+    monkeypatch.setattr(query_llm, "_call_openai", fake_call)
+    disk = SQLiteResponseCache(tmp_path / "llm.sqlite")
+    original = query_llm._response_cache
+    query_llm.set_response_cache(TieredResponseCache(MemoryResponseCache(), disk))
+    try:
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(query_openai("same prompt"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert calls == ["same prompt"] and set(out) == {"answer to same prompt"}
+        # The disk tier survives a fresh memory tier; non-zero temperature bypasses the cache
+        query_llm.set_response_cache(TieredResponseCache(MemoryResponseCache(), disk))
+        assert query_openai("same prompt") == "answer to same prompt" and len(calls) == 1
+        query_openai("same prompt", temperature=0.7)
+        assert len(calls) == 2
+    finally:
+        query_llm.set_response_cache(original)
+        disk.close()
+
+def test_async_client_retries_against_local_stub_server():
+    import json, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from llm.client import LLMClient
+    seen = []
+
+    class Stub(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen.append(body["messages"][0]["content"])
+            if len(seen) == 1:  # first request is throttled
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            payload = json.dumps({"choices": [{"message": {"content": "echo " + seen[-1]}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = LLMClient(api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1", backoff_base=0.01)
+    try:
+        assert client.complete("hi") == "echo hi" and seen == ["hi", "hi"]
+        assert client.complete_many(["a", "b", "c"]) == ["echo a", "echo b", "echo c"]
+    finally:
+        client.close()
+        server.shutdown()
+
+def test_bad_responses_raise_instead_of_mock_answer(monkeypatch):
+    import itertools, json, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import pytest
+    from llm import query_llm
+    from llm.client import LLMClient, LLMError
+    # A 200 that is not JSON, and two payloads of the wrong shape
+    bodies = [b"<html>not json</html>", json.dumps({"choices": []}).encode(), b"[1, 2]"]
+    served = itertools.cycle(bodies)
+
+    class Stub(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            body = next(served)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = LLMClient(api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(query_llm, "get_client", lambda: client)
+    try:
+        for _ in bodies:
+            with pytest.raises(LLMError):
+                client.complete("hi")
+        # With a key set, a failure is an error, not the mocked answer
+        with pytest.raises(LLMError):
+            query_llm.query_openai("hi", use_cache=False)
+        with pytest.raises(LLMError):
+            query_llm.query_openai_many(["a", "b"])
+        with pytest.raises(LLMError):
+            list(query_llm.stream_openai("hi", use_cache=False))
+        bad_url = LLMClient(api_key="k", base_url="http://", max_retries=0)
+        with pytest.raises(LLMError):
+            bad_url.complete("hi")
+        bad_url.close()
+    finally:
+        client.close()
+        server.shutdown()
+
+def test_query_openai_many_shares_coalescing_with_query_openai(monkeypatch):
+    import asyncio, threading, time
+    from llm import query_llm
+    from llm.response_cache import MemoryResponseCache
+    calls = []
+
+    class FakeClient:
+        def complete(self, prompt, **kw):
+            calls.append(prompt)
+            time.sleep(0.2)
+            return f"answer to {prompt}"
+
+        async def acomplete(self, prompt, **kw):
+            calls.append(prompt)
+            await asyncio.sleep(0.2)
+            return f"answer to {prompt}"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(query_llm, "httpx", object())
+    monkeypatch.setattr(query_llm, "get_client", lambda: FakeClient())
+    original = query_llm._response_cache
+    query_llm.set_response_cache(MemoryResponseCache())
+    try:
+        leader = threading.Thread(target=query_llm.query_openai, args=("p",))
+        leader.start()
+        time.sleep(0.05)
+        # "p" is already in flight from query_openai; duplicates in the batch are sent once
+        assert query_llm.query_openai_many(["p", "q", "p", "q"]) == ["answer to p", "answer to q"] * 2
+        leader.join()
+        assert sorted(calls) == ["p", "q"]
+    finally:
+        query_llm.set_response_cache(original)
+
+def test_stream_mock_records_time_to_first_token():
+    from llm.query_llm import stream_openai, MOCK_ANSWER
+    stats = {}
+    chunks = list(stream_openai("Test", stats=stats))
+    assert len(chunks) > 1 and "".join(chunks) == MOCK_ANSWER
+    assert stats["chunks"] == len(chunks) and 0 <= stats["ttft_s"] <= stats["total_s"]
+
+def test_client_stream_parses_server_sent_events():
+    import json, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from llm.client import LLMClient
+    requests = []
+
+    class SSEStub(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(self.path)
+            if len(requests) == 1:  # drop the connection before any token: retried
+                self.close_connection = True
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for tok in ["Hel", "lo", "!"]:
+                event = {"choices": [{"delta": {"content": tok}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SSEStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = LLMClient(api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1", backoff_base=0.01)
+    try:
+        assert list(client.stream("hi")) == ["Hel", "lo", "!"] and len(requests) == 2
+    finally:
+        client.close()
+        server.shutdown()
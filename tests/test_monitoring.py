@@ -0,0 +1,63 @@
+#**Author:** Carlos Stalin Saritama Atopo  
+#**Email:** cssaritama@gmail.com  
+#**Area of Specialization:** Analytics, Advanced Analytics, and Artificial Intelligence  
+#**Date:** August 2025 
+
+def test_feedback_store_group_commits_concurrent_writers(tmp_path):
+    import csv
+    from concurrent.futures import ThreadPoolExecutor
+    from monitoring.feedback_store import COLUMNS, FeedbackStore
+    store = FeedbackStore(tmp_path / "feedback.sqlite", flush_interval=0.05, max_buffer=500)
+
+    def session(i):
+        for j in range(250):
+            store.add(f"query {i}", f"answer, with comma\nand newline {j}", "Yes", rating=j % 5 + 1,
+                      source_snippet="s", source=f"a.txt#{j}")
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(session, range(8)))
+    assert store.count() == 2000 and store.pending == 0
+    assert len(store.rows(query="query 3")) == 250
+    assert len(store.rows(min_rating=5)) == 400
+
+    path = tmp_path / "export.csv"
+    assert store.export_csv(str(path)) == 2000
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == COLUMNS and len(rows) == 2001
+    copy = FeedbackStore(tmp_path / "copy.sqlite")
+    assert copy.import_csv(str(path)) == 2000
+    first = copy.rows(limit=1)[0]
+    assert first["response"].startswith("answer, with comma\n") and first["source"].startswith("a.txt#")
+    store.close()
+    copy.close()
+    assert not store._thread.is_alive()
+
+def test_metrics_store_prunes_rows_past_retention(tmp_path):
+    import sqlite3
+    import time
+    import pytest
+    from monitoring.tracing import MetricsStore
+    store = MetricsStore(tmp_path / "metrics.sqlite", retention_days=1)
+    now, old = time.time(), time.time() - 2 * 86400
+    store.write(spans=[(old, "retrieve", 5.0), (now, "retrieve", 7.0)], counters=[(old, "tokens", 3), (now, "tokens", 4)],
+                gauges=[(old, "hit_rate", 0.1), (now, "hit_rate", 0.5)])
+    assert store.counter_totals() == {"tokens": 7}  # pruned at most once an hour
+    assert store.prune() == 3
+    assert store.latency_summary()["retrieve"]["count"] == 1 and store.counter_totals() == {"tokens": 4}
+    assert store.latest_gauges() == {"hit_rate": 0.5}
+    plan = " ".join(str(r) for r in store._rows("EXPLAIN QUERY PLAN SELECT MAX(ts) FROM gauges WHERE name = 'x'"))
+    assert "gauges_name_ts" in plan
+    store.write(counters=[(old, "tokens", 3)])
+    # Readers neither prune nor write
+    reader = MetricsStore(tmp_path / "metrics.sqlite", retention_days=1, read_only=True)
+    assert reader.prune() == 0 and reader.counter_totals() == {"tokens": 7}
+    with pytest.raises(sqlite3.Error):
+        reader.write(counters=[(now, "tokens", 1)])
+    reader.close()
+    store.close()
+    # Reopening prunes right away; retention 0 keeps everything
+    assert MetricsStore(tmp_path / "metrics.sqlite", retention_days=1).counter_totals() == {"tokens": 4}
+    kept = MetricsStore(tmp_path / "kept.sqlite", retention_days=0)
+    kept.write(counters=[(0.0, "tokens", 1)])
+    assert kept.prune() == 0 and kept.counter_totals() == {"tokens": 1}
+    kept.close()
@@ -10,3 +10,411 @@ def test_simple_retriever():
     r = SimpleRetriever(chunks)
     out = r.search("depression")
     assert len(out) >= 0
+
+def test_vector_index_persisted_and_reused(tmp_path):
+    import json
+    import numpy as np
+    from retrieval import vector_store
+    chunks = [{"source": "a.txt", "chunk_id": 0, "text": "Depression is common."},
+              {"source": "b.txt", "chunk_id": 0, "text": "Anxiety is manageable."}]
+    (tmp_path / "chunks.json").write_text(json.dumps(chunks))
+    built = vector_store.load_or_build_index(str(tmp_path))
+    assert (tmp_path / "index" / "embeddings.npy").exists()
+    loaded = vector_store.load_or_build_index(str(tmp_path))
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.texts == built.texts and loaded.sources == ["a.txt", "b.txt"]
+    # Only row metadata is persisted; text is read from the chunk file by row
+    meta = json.loads((tmp_path / "index" / "meta.json").read_text())
+    assert meta["chunks"][1] == {"source": "b.txt", "chunk_id": 0, "row": 1}
+    assert loaded.search("anxiety", top_k=1)[0]["text"] == "Anxiety is manageable."
+    # A changed chunks.json invalidates the artifact
+    (tmp_path / "chunks.json").write_text(json.dumps(chunks[:1]))
+    rebuilt = vector_store.load_or_build_index(str(tmp_path))
+    assert not isinstance(rebuilt.embeddings, np.memmap) and len(rebuilt.texts) == 1
+
+def test_ann_backends_agree_with_exact_search():
+    import numpy as np
+    from retrieval.ann_index import make_index
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(500, 32)).astype("float32")
+    queries = emb[:5] + 0.01
+    _, exact = make_index("numpy", emb).search(queries, 1)
+    assert exact[:, 0].tolist() == [0, 1, 2, 3, 4]
+    for kind, params in [("flat", {}), ("ivf", {"nprobe": 64}), ("hnsw", {"ef_search": 64})]:
+        _, ids = make_index(kind, emb, **params).search(queries, 1)
+        assert ids[:, 0].tolist() == exact[:, 0].tolist()
+
+def test_sharded_search_merges_shard_top_k(tmp_path):
+    import numpy as np
+    from retrieval.ann_index import make_index
+    from retrieval.chunk_store import ChunkWriter
+    from retrieval.vector_store import InMemoryVectorStore
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(1000, 16)).astype("float32")
+    queries = rng.normal(size=(7, 16)).astype("float32")
+    want_s, want = make_index("numpy", emb).search(queries, 10)
+    index = make_index("sharded", emb, shards=4, workers=3, min_shard_rows=100)
+    assert [b - a for a, b in index.shards] == [250] * 4
+    for params in ({}, {"workers": 1}, {"shards": 7}, {"shards": 64}):
+        index.set_params(**params)
+        got_s, got = index.search(queries, 10)
+        assert got.tolist() == want.tolist() and np.allclose(got_s, want_s, atol=1e-5)
+    assert len(index.shards) == 10  # capped at min_shard_rows rows per shard
+    # One worker and one shard unless configured; the layout follows the worker count
+    index = make_index("sharded", emb, min_shard_rows=100)
+    assert index.workers == 1 and index.shards == [(0, 1000)]
+    index.set_params(workers=4)
+    assert [b - a for a, b in index.shards] == [250] * 4
+    assert index.search(queries, 10)[1].tolist() == want.tolist()
+
+    chunks = [{"source": f"{i}.txt", "chunk_id": 0, "text": f"note about topic {i}"} for i in range(50)]
+    with ChunkWriter(str(tmp_path)) as writer:
+        writer.write_many(chunks)
+    store = InMemoryVectorStore("sharded", shards=4, min_shard_rows=10)
+    store.build(chunks)
+    store.save(str(tmp_path))
+    loaded = InMemoryVectorStore.load(str(tmp_path), index_type="sharded", shards=4, min_shard_rows=10)
+    assert loaded.search("topic 7", top_k=3) == store.search("topic 7", top_k=3)
+    assert loaded.get_index().embeddings is loaded.embeddings and len(loaded.index.shards) > 1
+
+def test_compact_storage_rescored_from_memory_mapped_rows(tmp_path):
+    import numpy as np
+    import pytest
+    from retrieval.ann_index import NumpyCompactIndex, _CompactIndex, make_index
+    from retrieval.chunk_store import ChunkWriter
+    from retrieval.vector_store import InMemoryVectorStore
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(2000, 32)).astype("float32")
+    queries = emb[:20] + 0.05 * rng.normal(size=(20, 32)).astype("float32")
+    _, exact = make_index("numpy", emb).search(queries, 5)
+    for kind in ("fp16", "sq8"):
+        for index in (make_index(kind, emb), NumpyCompactIndex.build(emb, kind)):
+            _, ids = index.search(queries, 5)
+            assert ids.tolist() == exact.tolist()
+            assert index.bytes_per_dim == (2 if kind == "fp16" else 1)
+    with pytest.raises(TypeError):
+        _CompactIndex()
+
+    chunks = [{"source": f"{i}.txt", "chunk_id": 0, "text": f"note about topic {i}"} for i in range(50)]
+    flat = InMemoryVectorStore("flat")
+    flat.build(chunks)
+    with ChunkWriter(str(tmp_path)) as writer:
+        writer.write_many(chunks)
+    store = InMemoryVectorStore("sq8")
+    store.build(chunks)
+    store.save(str(tmp_path))
+    # Saving a compact store swaps the in-memory matrix for a map of the saved file
+    assert isinstance(store.embeddings, np.memmap) and store.index.full is store.embeddings
+    loaded = InMemoryVectorStore.load(str(tmp_path), index_type="sq8")
+    for s in (store, loaded):
+        # Rescored scores are exact, so they match full-precision search (up to ties)
+        got, want = s.search("topic 7", top_k=3), flat.search("topic 7", top_k=3)
+        assert got[0]["text"] == want[0]["text"]
+        assert np.allclose([r["score"] for r in got], [r["score"] for r in want], atol=1e-6)
+    assert loaded.index.full is loaded.embeddings
+
+def test_top_k_rows_and_search_many():
+    import numpy as np
+    from retrieval.ann_index import top_k_rows
+    from retrieval.vector_store import InMemoryVectorStore
+    scores = np.random.default_rng(1).normal(size=(4, 100)).astype("float32")
+    top_s, top_i = top_k_rows(scores, 5)
+    assert top_i.tolist() == np.argsort(-scores, axis=1)[:, :5].tolist()
+    assert np.allclose(top_s, -np.sort(-scores, axis=1)[:, :5])
+    store = InMemoryVectorStore(index_type="numpy")
+    store.build([{"text": "Depression is common."}, {"text": "Anxiety is manageable."}])
+    assert np.allclose(np.linalg.norm(store.embeddings, axis=1), 1.0)
+    batch = store.search_many(["depression", "anxiety", "sleep"], top_k=2)
+    assert len(batch) == 3 and all(len(r) == 2 for r in batch)
+    assert [r["text"] for r in batch[0]] == [r["text"] for r in store.search("depression", top_k=2)]
+
+def test_bm25_persisted_and_fused(tmp_path):
+    from retrieval.bm25 import BM25Index
+    from retrieval.retriever import HybridRetriever
+    from retrieval.vector_store import InMemoryVectorStore
+    empty = InMemoryVectorStore()  # BM25 only: no dense index built
+    chunks = [{"text": "Depression is common and treatable."},
+              {"text": "Breathing exercises help manage anxiety."},
+              {"text": "Sleep hygiene supports mental health."}]
+    index = BM25Index.build(chunks, chunks_hash="h")
+    assert index.search("manage anxiety", top_k=2)[0][0] == 1
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.chunks_hash == "h"
+    assert loaded.search("manage anxiety", top_k=2) == index.search("manage anxiety", top_k=2)
+    for fusion in ("rrf", "weighted"):
+        out = HybridRetriever(chunks, bm25=loaded, store=empty, fusion=fusion).search("sleep hygiene", k=2)
+        assert out[0]["text"] == chunks[2]["text"]
+
+def test_simple_retriever_index_matches_substring_scan():
+    chunks = [{"text": "Depression is common."}, {"text": "Anxiety is manageable."},
+              {"text": "Depressive episodes vary."}, {"text": "Support is common in groups."}]
+    r = SimpleRetriever(chunks)
+    for q in ["depress", "is common", "ety is man", "is", "", "xyz", "common."]:
+        for k in (1, 3):
+            expected = [c for c in chunks if q.lower() in c["text"].lower()][:k]
+            assert r.search(q, k=k) == expected
+
+def test_embedding_provider_loaded_once_and_shared():
+    import threading
+    import numpy as np
+    from retrieval import embeddings
+    loads = []
+
+    class FakeEmbedder:
+        name = "fake"
+        def __init__(self):
+            loads.append(1)
+        def encode(self, texts):
+            return np.ones((len(texts), 4), dtype="float32")
+
+    embeddings.register_provider("fake", FakeEmbedder)
+    assert not loads  # registration does not load anything
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(embeddings.get_embedder("fake"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1 and all(e is seen[0] for e in seen)
+    assert embeddings.warm_up("fake") is seen[0]
+
+def test_hashing_embedder_is_stable_and_meaningful():
+    import os, subprocess, sys
+    from pathlib import Path
+    import numpy as np
+    from retrieval.embeddings import HashingEmbedder
+    texts = ["Depression is common and treatable.", "depression is common", "Breathing exercises help."]
+    emb = HashingEmbedder().encode(texts)
+    assert emb.shape == (3, 384) and np.allclose(np.linalg.norm(emb, axis=1), 1.0, atol=1e-5)
+    assert emb[0] @ emb[1] > emb[0] @ emb[2]
+    code = ("from retrieval.embeddings import HashingEmbedder;"
+            "print(HashingEmbedder().encode(['Depression is common and treatable.'])[0].round(5).tolist())")
+    root = str(Path(__file__).resolve().parents[1])
+    outs = {subprocess.check_output([sys.executable, "-c", code],
+                                    env={**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": root}).strip()
+            for seed in ("1", "2")}
+    assert len(outs) == 1
+
+def test_lru_ttl_cache_and_index_invalidation():
+    from retrieval.cache import LRUCache, RESULTS
+    from retrieval.vector_store import InMemoryVectorStore
+    now = [0.0]
+    c = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    c.set("a", 1); c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)  # evicts least recently used "b"
+    assert c.get("b") is None and c.get("c") == 3
+    now[0] = 11.0
+    assert c.get("a") is None  # expired
+    assert c.stats()["hits"] == 2 and c.stats()["misses"] == 2
+
+    store = InMemoryVectorStore(index_type="numpy")
+    store.build([{"text": "Depression is common."}, {"text": "Anxiety is manageable."}])
+    hits = RESULTS.hits
+    first = store.search("Signs of depression?", top_k=1)
+    assert store.search("signs of depression", top_k=1) == first and RESULTS.hits == hits + 1
+    # Callers get their own copies: mutating one does not reach later hits
+    first[0]["score"] = -1.0
+    first[0]["rerank_score"] = 5
+    assert store.search("signs of depression", top_k=1)[0]["score"] != -1.0
+    assert "rerank_score" not in store.search("signs of depression", top_k=1)[0]
+    store.build([{"text": "Sleep hygiene matters."}])
+    assert store.search("signs of depression", top_k=1)[0]["text"] == "Sleep hygiene matters."
+
+def test_chunk_store_streaming_and_random_access(tmp_path):
+    import json
+    from retrieval.chunk_store import ChunkWriter, iter_chunks, open_chunks, write_chunks
+    chunks = [{"source": f"{i % 3}.txt", "chunk_id": i, "text": f"chunk {i} ünïcode"} for i in range(50)]
+    with ChunkWriter(str(tmp_path)) as writer:
+        for c in chunks:
+            writer.write(c)
+    assert list(iter_chunks(str(tmp_path))) == chunks
+    store = open_chunks(str(tmp_path))
+    assert len(store) == 50 and store[17] == chunks[17] and store[-1] == chunks[-1]
+    assert store.text(3) == "chunk 3 ünïcode"
+    # A stale offset index is rebuilt from the file
+    (tmp_path / "chunks.offsets.npy").unlink()
+    assert open_chunks(str(tmp_path))[42] == chunks[42]
+    # Crash after the data file was replaced but before the index: same size, other line breaks
+    crashed = tmp_path / "crashed"
+    write_chunks(str(crashed), [{"text": "a" * 5}, {"text": "b" * 10}])
+    old_index = (crashed / "chunks.offsets.npy").read_bytes()
+    write_chunks(str(crashed), [{"text": "a" * 10}, {"text": "b" * 5}])
+    (crashed / "chunks.offsets.npy").write_bytes(old_index)
+    assert list(open_chunks(str(crashed))) == [{"text": "a" * 10}, {"text": "b" * 5}]
+    # Legacy chunks.json folders still load
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    (legacy / "chunks.json").write_text(json.dumps(chunks[:2], indent=2))
+    assert open_chunks(str(legacy)) == chunks[:2] and list(iter_chunks(str(legacy))) == chunks[:2]
+
+def test_retrieval_engine_hot_swaps_on_new_chunks(tmp_path):
+    import gc
+    from concurrent.futures import ThreadPoolExecutor
+    from retrieval.chunk_store import write_chunks
+    from retrieval.engine import RetrievalEngine
+    write_chunks(str(tmp_path), [{"source": "a.txt", "chunk_id": 0, "text": "Depression is common and treatable."}])
+    engine = RetrievalEngine(str(tmp_path), check_interval=3600)
+    first = engine.snapshot()
+    assert engine.search("depression", method="simple")[0]["source"] == "a.txt"
+    assert engine.refresh() is False
+
+    write_chunks(str(tmp_path), [{"source": "a.txt", "chunk_id": 0, "text": "Depression is common and treatable."},
+                                 {"source": "b.txt", "chunk_id": 0, "text": "Anxiety responds to breathing exercises."}])
+    with ThreadPoolExecutor(4) as pool:
+        # Concurrent readers see either the old or the new version, never a mix
+        sizes = list(pool.map(lambda _: len(engine.snapshot().store.texts), range(50)))
+        assert engine.refresh() is True
+    assert set(sizes) <= {1, 2}
+    assert first.store is not engine.snapshot().store and len(engine) == 2
+    # The replaced chunk store stays open while a reader holds its snapshot, then closes
+    old_chunks = first.chunks
+    assert old_chunks[0]["source"] == "a.txt"
+    del first
+    gc.collect()
+    assert old_chunks._file.closed
+    assert engine.search("anxiety breathing", method="hybrid", k=1)[0]["source"] == "b.txt"
+    assert engine.search("anxiety", method="vector", k=2)
+    engine.close()
+
+def test_rerankers_batching_cache_and_budget():
+    import time
+    import pytest
+    from retrieval.rerank import (BudgetedReranker, CrossEncoderReranker, OverlapReranker, Reranker,
+                                  TokenSetReranker, rerank_by_overlap)
+    cands = [{"source": "a.txt", "chunk_id": i, "text": t} for i, t in enumerate(
+        ["sleep and mood", "anxiety and panic attacks", "panic attacks treatment for anxiety", "diet"])]
+    query = "anxiety panic attacks"
+    assert TokenSetReranker().rerank(query, cands) == OverlapReranker().rerank(query, cands) == rerank_by_overlap(cands, query)
+
+    class FakeModel:
+        def __init__(self, delay=0.0):
+            self.calls, self.delay = [], delay
+        def predict(self, pairs, batch_size=32):
+            time.sleep(self.delay)
+            self.calls.append(len(pairs))
+            return [len(t) for _, t in pairs]
+
+    model = FakeModel()
+    ce = CrossEncoderReranker(model=model)
+    assert ce.rerank(query, cands, top_k=2) == [cands[2], cands[1]]
+    ce.rerank(query, cands[:3] + [{"source": "b.txt", "chunk_id": 0, "text": "new"}])
+    assert model.calls == [4, 1]  # one batched pass, then only the uncached candidate
+
+    slow = FakeModel(delay=0.3)
+    budgeted = BudgetedReranker(CrossEncoderReranker(model=slow), TokenSetReranker(), budget_ms=20, workers=1)
+    start = time.perf_counter()
+    assert budgeted.rerank(query, cands)[0] in (cands[1], cands[2])
+    # The late call holds the only slot: the next request falls back without queueing another one
+    assert budgeted.rerank(query, cands[:2])[0] == cands[1]
+    assert time.perf_counter() - start < 0.25 and budgeted.fallbacks == 2
+    time.sleep(0.4)
+    assert slow.calls == [4]
+    with pytest.raises(TypeError):
+        Reranker()
+
+def test_tracing_records_stage_percentiles(tmp_path):
+    from monitoring import tracing
+    from retrieval.retriever import HybridRetriever
+    from retrieval.vector_store import InMemoryVectorStore
+    from llm.prompt_templates import compose_prompt
+    chunks = [{"source": "a.txt", "chunk_id": i, "text": f"coping with stress tip {i}"} for i in range(20)]
+    store = InMemoryVectorStore()
+    store.build(chunks)
+    assert tracing.span("x") is tracing.span("y")  # shared no-op while disabled
+    recorder = tracing.enable_tracing(tracing.MetricsStore(tmp_path / "metrics.sqlite"), flush_interval=3600)
+    try:
+        retriever = HybridRetriever(chunks, store=store)
+        for i in range(5):
+            compose_prompt("stress", retriever.search(f"stress tip {i}", k=3))
+        tracing.count("llm.prompt_tokens", 12)
+        recorder.flush()
+    finally:
+        tracing.disable_tracing()
+    live = recorder.summary()
+    assert {"retrieve.hybrid", "bm25.search", "embed.query", "vector.index_search", "prompt.compose"} <= set(live)
+    assert live["retrieve.hybrid"]["count"] == 5
+    stored = recorder.store.latency_summary()
+    assert stored["retrieve.hybrid"]["p99_ms"] >= stored["retrieve.hybrid"]["p50_ms"] > 0
+    assert recorder.store.counter_totals()["llm.prompt_tokens"] == 12
+    assert "cache.results.hit_rate" in recorder.store.latest_gauges()
+
+def test_benchmark_harness_small_corpus(tmp_path):
+    import copy
+    from evaluation.benchmark import compare, run_benchmark
+    run = run_benchmark(300, n_queries=10, workdir=str(tmp_path))
+    assert run["corpus"]["n_chunks"] == 300
+    assert set(run["query"]) == set(run["end_to_end"]) == {"simple", "vector", "hybrid"}
+    assert run["query"]["hybrid"]["p99_ms"] >= run["query"]["hybrid"]["p50_ms"] > 0
+    slower = copy.deepcopy({"runs": [run]})
+    slower["runs"][0]["query"]["vector"]["p95_ms"] *= 2
+    regressions = compare({"runs": [run]}, slower)
+    assert [(r["section"], r["method"], r["metric"]) for r in regressions] == [("query", "vector", "p95_ms")]
+
+def test_evaluation_runner_caches_by_dataset_index_and_variant(tmp_path, monkeypatch):
+    from retrieval.chunk_store import write_chunks
+    from retrieval.engine import RetrievalEngine
+    import pytest
+    from evaluation.runner import EvaluationStore, dataset_hash, run_evaluation
+    write_chunks(tmp_path / "data", [{"source": "a.txt", "chunk_id": 0, "text": "Depression is common and treatable."},
+                                     {"source": "a.txt", "chunk_id": 1, "text": "Slow breathing exercises help manage anxiety."}])
+    engine = RetrievalEngine(str(tmp_path / "data"))
+    store = EvaluationStore(tmp_path / "results.sqlite")
+    queries = [{"q": "breathing exercises", "gt": ["breathing exercises"]}]
+    variants = {"plain": lambda q, c: q, "context": lambda q, c: q + " " + " ".join(x["text"] for x in c)}
+    first = run_evaluation(engine, queries, variants, store=store)
+    assert first["computed"] == ["retrieval", "prompts"]
+    assert first["retrieval"]["simple"]["mean"]["recall@3"] == 1.0
+    assert set(first["prompts"]) == {"plain", "context"}
+    # Everything cached: no retrieval for the prompt contexts either
+    monkeypatch.setattr(engine.snapshot().hybrid, "search", lambda *a, **kw: pytest.fail("contexts recomputed"))
+    assert run_evaluation(engine, queries, variants, store=store)["computed"] == []
+    monkeypatch.undo()
+    variants["plain"] = lambda q, c: q + "?"  # only the edited variant is recomputed
+    assert run_evaluation(engine, queries, variants, store=store)["computed"] == ["prompts"]
+    more = queries + [{"q": "signs of depression", "gt": ["depression is common"]}]
+    assert run_evaluation(engine, more, variants, store=store)["computed"] == ["retrieval", "prompts"]
+    latest = store.latest(first["index_version"])
+    assert set(latest) == {"retrieval", "prompt"} and len(latest["prompt"]) == 2
+    assert {m["dataset_hash"] for kind in latest.values() for m in kind.values()} == {dataset_hash(more)}
+    monkeypatch.setenv("EVAL_RESULTS_PATH", str(tmp_path / "results.sqlite"))
+    assert EvaluationStore().latest() == latest
+
+def test_prefiltered_search_by_source_and_tag(tmp_path):
+    import numpy as np
+    import pytest
+    from retrieval.bm25 import BM25Index
+    from retrieval.retriever import HybridRetriever
+    from retrieval.vector_store import InMemoryVectorStore, embed_queries
+    topics = ["anxiety breathing", "depression support", "sleep hygiene"]
+    chunks = [{"source": f"{src}_{i % 3}.txt", "chunk_id": i, "text": f"{topics[i % 3]} note {i}",
+               "tags": ["sleep"] if i % 3 == 2 else []}
+              for src in ("nhs", "who") for i in range(30)]
+    store = InMemoryVectorStore("flat")
+    store.build(chunks)
+    store.save(str(tmp_path))
+    store = InMemoryVectorStore.load(str(tmp_path), index_type="flat")
+
+    res = store.search("sleep hygiene", top_k=5, filters={"source": "nhs_*"})
+    assert len(res) == 5 and all(r["source"].startswith("nhs_") for r in res)
+    # Same ranking as scoring the matching rows exhaustively
+    rows = np.array([i for i, c in enumerate(chunks) if c["source"].startswith("nhs_")])
+    q = embed_queries(["sleep hygiene"])[0]
+    scores = np.asarray(store.embeddings)[rows] @ (q / np.linalg.norm(q))
+    assert [r["chunk_id"] for r in res] == [chunks[i]["chunk_id"] for i in rows[np.argsort(-scores)[:5]]]
+    assert {r["chunk_id"] for r in store.search("note", top_k=50, filters={"tag": "sleep", "source": "who_2.txt"})} \
+        == {c["chunk_id"] for c in chunks if c["source"] == "who_2.txt"}
+    assert store.search("note", filters={"source": "missing.txt"}) == []
+    with pytest.raises(ValueError):
+        store.search("note", filters={"author": "x"})
+
+    hybrid = HybridRetriever(chunks, bm25=BM25Index.build(chunks), store=store)
+    res = hybrid.search("depression support", k=4, filters={"source": ["who_1.txt"]})
+    assert res and {r["source"] for r in res} == {"who_1.txt"}
+    res = SimpleRetriever(chunks).search("note 1", k=50, filters={"chunk_id": [1, 10]})
+    assert [(r["source"], r["chunk_id"]) for r in res] == [("nhs_1.txt", 1), ("nhs_1.txt", 10),
+                                                           ("who_1.txt", 1), ("who_1.txt", 10)]
+    # nhs and who chunks share their texts; fusion keeps them apart
+    res = HybridRetriever(chunks, bm25=BM25Index.build(chunks), store=store, candidates=60).search("note", k=60)
+    assert len(res) == 60 and len({(r["source"], r["chunk_id"]) for r in res}) == 60
@@ -1,14 +1,13 @@
 """Utility helpers used across the project."""
 
-import os, json
+from retrieval.chunk_store import open_chunks
 from monitoring.feedback_store import save_feedback as _save_feedback
 
 def load_documents(folder="data/processed"):
-    path = os.path.join(folder, "chunks.json")
-    if not os.path.exists(path):
-        return []
-    return json.load(open(path, "r", encoding="utf-8"))
+    # Random-access chunk store; texts are only parsed when a chunk is read
+    chunks = open_chunks(folder)
+    return chunks if chunks is not None else []
 
-def save_feedback(query, response, feedback, rating=None, source_snippet=None):
-    # Wrapper to store feedback with optional rating and source snippet
-    _save_feedback(query, response, feedback, rating=rating, source_snippet=source_snippet)
+def save_feedback(query, response, feedback, rating=None, source_snippet=None, source=None):
+    # Wrapper to store feedback with optional rating, source snippet and source attribution
+    _save_feedback(query, response, feedback, rating=rating, source_snippet=source_snippet, source=source)